@@ -1,44 +1,200 @@
 #!/usr/bin/env python3
 
-import requests
+import struct
 import time
-import block
-import fees
+from collections import deque
+from dataclasses import dataclass
+import transport
+from cache import RecordCache, CachedSource
 
-class BlockMetadata:
-    def __init__(self):
+STATE = struct.Struct("<II32sIIB")  # tip height, timestamp, hash, missed, reorgs, indexed count
+INDEXED = struct.Struct("<II32sI")  # height, timestamp, hash, tx_count
+
+
+def _hash_bytes(h):
+    return bytes.fromhex(h or "")
+
+def _hash_hex(b):
+    return b.hex() if b.strip(b"\0") else None
+
+
+@dataclass(frozen=True)
+class BlockInfo:
+    height: int
+    hash: str
+    timestamp: int
+    tx_count: int = 0
+
+    @classmethod
+    def of(cls, metadata):
+        return cls(
+            height=metadata.get("height", 0),
+            hash=metadata.get("id"),
+            timestamp=metadata.get("timestamp", 0),
+            tx_count=metadata.get("tx_count", 0),
+        )
+
+
+class BlockMetadata(CachedSource):
+    """
+    Chain tip plus a ring index of the last `depth` blocks.
+    One tip-hash poll per update; when the tip moves, one bulk /api/v1/blocks
+    call refreshes the whole index, so blocks landing between polls aren't skipped.
+    """
+    def __init__(self, http=None, depth=32):
+        self.http = http or transport.shared()
         self.hash = None
         self.timestamp = 0
         self.height = 0
+        self.min_ago = 0
         self.new_block = False
         self.request_error_count = 0
         self.epoch_now = int(time.time())
+        self.blocks = deque(maxlen=depth)  # BlockInfo, oldest first
+        self.missed = 0  # blocks that landed between two updates
+        self.reorgs = 0
+        self.catchup_needed = True
+        self.cache = RecordCache("block", ("height", "timestamp", "hash"), "II32s")
+        self.load_cache()
+
+    def cache_values(self):
+        return {"height": self.height, "timestamp": self.timestamp, "hash": bytes.fromhex(self.hash or "")}
+
+    def restore(self, record):
+        self._set_tip(BlockInfo(record["height"], record["hash"].hex(), record["timestamp"]))
+        self.new_block = False
+
+    def dump_state(self):
+        blocks = list(self.blocks)
+        out = [STATE.pack(self.height, self.timestamp, _hash_bytes(self.hash), self.missed, self.reorgs, len(blocks))]
+        out += [INDEXED.pack(b.height, b.timestamp, _hash_bytes(b.hash), b.tx_count) for b in blocks]
+        return b"".join(out)
+
+    def load_state(self, buf):
+        height, timestamp, tip, missed, reorgs, count = STATE.unpack_from(buf, 0)
+        blocks = []
+        for i in range(count):
+            h, ts, bh, tx_count = INDEXED.unpack_from(buf, STATE.size + i * INDEXED.size)
+            blocks.append(BlockInfo(h, _hash_hex(bh), ts, tx_count))
+        self.blocks.clear()
+        self.blocks.extend(blocks)
+        self.missed = missed
+        self.reorgs = reorgs
+        if tip.strip(b"\0"):
+            self._set_tip(BlockInfo(height, _hash_hex(tip), timestamp))
+        self.new_block = False
+        #the first poll still refreshes the index with one bulk call
+        self.catchup_needed = True
+
+    def apply_block(self, metadata):
+        """Take one block dict (the websocket 'block' push, or the newest of a bulk list)."""
+        info = BlockInfo.of(metadata)
+        if self.blocks and info.height > self.blocks[-1].height + 1:
+            #a gap: let the next poll backfill it with one bulk call
+            self.missed += info.height - self.blocks[-1].height - 1
+            self.catchup_needed = True
+        self._index([info])
+        self._set_tip(info)
+        self.success = True
+        self.request_error_count = 0
+        self.mark_fresh()
+
+    def apply_blocks(self, blocks):
+        """Take a bulk block list (REST /api/v1/blocks or the websocket 'blocks' push)."""
+        infos = sorted((BlockInfo.of(b) for b in blocks), key=lambda b: b.height)
+        if not infos:
+            return
+        if self.blocks:
+            gap = infos[-1].height - self.blocks[-1].height - 1
+            if gap > 0:
+                self.missed += gap
+        self._index(infos)
+        missing = self.missing()
+        if missing and missing[-1] < infos[0].height:
+            #older than anything the bulk list reaches, it can't fill them:
+            #keep the unbroken run up to the tip
+            while self.blocks[0].height <= missing[-1]:
+                self.blocks.popleft()
+            missing = []
+        #a gap inside the list's range (e.g. a push newer than the list) needs another call
+        self.catchup_needed = bool(missing)
+        self._set_tip(self.blocks[-1])
+        self.success = True
+        self.request_error_count = 0
+        self.mark_fresh()
+
+    def _index(self, infos):
+        """Merge blocks into the index by height, older ones fill gaps below the tip."""
+        known = {b.height: b for b in self.blocks}
+        for info in sorted(infos, key=lambda b: b.height):
+            old = known.get(info.height)
+            if old is not None and old.hash != info.hash:
+                #same height, different hash: drop the stale branch from here up
+                self.reorgs += 1
+                print(f"Reorg detected at height {info.height}")
+                known = {h: b for h, b in known.items() if h < info.height}
+            known[info.height] = info
+        #the newest `depth` heights, oldest first
+        merged = sorted(known.values(), key=lambda b: b.height)[-self.blocks.maxlen:]
+        self.blocks.clear()
+        self.blocks.extend(merged)
+
+    def missing(self):
+        """Heights between the oldest and newest indexed block that aren't indexed."""
+        if not self.blocks:
+            return []
+        have = {b.height for b in self.blocks}
+        return [h for h in range(self.blocks[0].height, self.blocks[-1].height) if h not in have]
+
+    def _set_tip(self, info):
+        self.new_block = info.hash != self.hash
+        self.hash = info.hash
+        self.timestamp = info.timestamp
+        self.height = info.height
+        self.refresh_age()
+
+    def refresh_age(self):
+        self.epoch_now = int(time.time())
+        self.min_ago = max(0, round(self.block_age() / 60))
+
+    def block_age(self):
+        """Seconds since the tip was mined, no request needed."""
+        return max(0, time.time() - self.timestamp) if self.timestamp else 0
+
+    def avg_interval(self, n=None):
+        """Mean seconds between the last `n` indexed blocks (all of them by default)."""
+        blocks = list(self.blocks)[-(n + 1):] if n else list(self.blocks)
+        if len(blocks) < 2:
+            return None
+        #by height, not by count: the index can have gaps (missed pushes not backfilled yet)
+        return (blocks[-1].timestamp - blocks[0].timestamp) / (blocks[-1].height - blocks[0].height)
+
+    def report(self):
+        interval = self.avg_interval()
+        interval = f"{interval / 60:.1f} min" if interval else "-"
+        return [f"blocks: {len(self.blocks)} indexed, avg interval {interval}, {self.missed} missed between updates, {self.reorgs} reorgs"]
 
     def update(self):
         try:
-            new_hash = requests.get("https://mempool.space/api/blocks/tip/hash", timeout=5).text.strip()
-            if new_hash != self.hash:
-                r = requests.get(f"https://mempool.space/api/block/{new_hash}", timeout=5)
+            r = self.http.get("https://mempool.space/api/blocks/tip/hash")
+            r.raise_for_status()
+            new_hash = r.text.strip()
+            if new_hash != self.hash or self.catchup_needed:
+                r = self.http.get("https://mempool.space/api/v1/blocks")
                 r.raise_for_status()  # ensures HTTP success
-                metadata = r.json()
-                self.hash = metadata.get("id", self.hash)
-                self.timestamp = metadata.get("timestamp", 0)
-                self.height = metadata.get("height", 0)
-                self.epoch_now = int(time.time())
-                self.min_ago = max(0, round((time.time() - self.timestamp) / 60))
-                self.success = True
-                self.new_block = True
+                self.apply_blocks(r.json())
             else:
-                self.epoch_now = int(time.time())
-                self.min_ago = max(0, round((time.time() - self.timestamp) / 60))
+                self.refresh_age()
                 self.success = True
                 self.new_block = False
-                
+                self.mark_fresh()
+
             self.request_error_count = 0
-            
+
         except Exception as e:
             self.success = False
             self.request_error_count += 1
             print(f"Error fetching block metadata: {e}")
             self.new_block = False
+            self.mark_failed()
         return self
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+
+import threading
+import time
+
+
+class Stage:
+    def __init__(self, name, fn, needs=(), label=None, main=False):
+        self.name = name
+        self.fn = fn
+        self.needs = tuple(needs)
+        self.label = label or name  # shown on the lcd while it runs
+        self.main = main  # run on the calling thread (it drives the lcd itself)
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.error = None
+
+
+class Boot:
+    """
+    Boot steps as a dependency graph. A stage starts as soon as the stages it
+    needs have finished, each on its own thread, so independent steps (the
+    setup-key window, the network checks, data fetches) overlap.
+    Start/end of every stage is recorded relative to the start of boot.
+    """
+    def __init__(self):
+        self.stages = {}
+        self.t0 = time.monotonic()
+        self.marks = {}  # other milestones, e.g. the first frame
+        self._reported = False
+        self._cond = threading.Condition()
+
+    def add(self, name, fn, needs=(), label=None, main=False):
+        self.stages[name] = Stage(name, fn, needs, label, main)
+
+    def result(self, name):
+        return self.stages[name].result
+
+    def mark(self, name):
+        self.marks.setdefault(name, time.monotonic() - self.t0)
+
+    def _run_stage(self, stage):
+        try:
+            stage.result = stage.fn()
+        except BaseException as e:
+            stage.error = e
+        with self._cond:
+            stage.finished = time.monotonic() - self.t0
+            #claim the dependents before anyone waiting sees this stage finished,
+            #so run() never finds nothing running while they are about to start
+            ready = self._claim()
+            self._cond.notify_all()
+        #dependents start from here, even while the main thread is busy in a main stage
+        self._start(ready)
+
+    def _ready(self, stage):
+        return stage.started is None and all(self.stages[n].finished is not None and self.stages[n].error is None for n in stage.needs)
+
+    def _done(self, names):
+        return bool(names) and all(self.stages[n].finished is not None for n in names)
+
+    def _failed(self):
+        return [s for s in self.stages.values() if s.error is not None]
+
+    def _claim(self):
+        """Marks the stages that can start now as started, call with _cond held."""
+        if self._failed():
+            return []
+        ready = [s for s in self.stages.values() if not s.main and self._ready(s)]
+        for stage in ready:
+            stage.started = time.monotonic() - self.t0
+        return ready
+
+    def _start(self, ready):
+        for stage in ready:
+            threading.Thread(target=self._run_stage, args=(stage,), name=f"boot-{stage.name}", daemon=True).start()
+
+    def running(self):
+        """Stages started but not finished, in the order they were added."""
+        return [s for s in self.stages.values() if s.started is not None and s.finished is None]
+
+    def run(self, tick=None, on_change=None, until=None):
+        """
+        Run every stage, returns when all have finished, or as soon as the stages
+        named in `until` have (the rest keep running, start() can see them out).
+        tick() (e.g. Timeline.tick) is called while waiting, on_change() whenever
+        a stage starts or ends. Stages marked main run on this thread. The first
+        stage error is raised once the stages already running are done.
+        """
+        for stage in self.stages.values():
+            missing = [n for n in stage.needs if n not in self.stages]
+            if missing:
+                raise ValueError(f"boot stage {stage.name} needs unknown {missing}")
+        with self._cond:
+            ready = self._claim()
+        self._start(ready)
+        seen = None
+        while True:
+            with self._cond:
+                main = None if self._failed() else next((s for s in self.stages.values() if s.main and self._ready(s)), None)
+                if main:
+                    main.started = time.monotonic() - self.t0
+                elif not self.running() or self._done(until):
+                    break
+                state = [(s.started, s.finished) for s in self.stages.values()]
+            if on_change and state != seen:
+                seen = state
+                on_change()
+            if main:
+                self._run_stage(main)
+                continue
+            delay = tick() if tick else None
+            with self._cond:
+                self._cond.wait(0.25 if delay is None else min(delay, 0.25))
+        if on_change:
+            on_change()
+        failed = self._failed()
+        if until and not failed and self.running():
+            return
+        #once: start() after a run(until=...) that already saw everything finish has nothing new
+        if not self._reported:
+            self._reported = True
+            for line in self.report():
+                print(line)
+        if failed:
+            raise failed[0].error
+        skipped = [s.name for s in self.stages.values() if s.started is None]
+        if skipped:
+            raise RuntimeError(f"boot stages never started: {skipped}")
+
+    def start(self, on_error=None):
+        """
+        run() on a background thread, for a boot that doesn't drive the lcd
+        (no main stages). on_error(e) is called with whatever it raises.
+        """
+        def run():
+            try:
+                self.run()
+            except Exception as e:
+                if on_error:
+                    on_error(e)
+                else:
+                    print(f"boot failed: {e}")
+        threading.Thread(target=run, name="boot", daemon=True).start()
+
+    def report(self):
+        lines = []
+        for stage in sorted(self.stages.values(), key=lambda s: (s.started is None, s.started or 0)):
+            if stage.started is None:
+                lines.append(f"boot: {stage.name} skipped")
+                continue
+            end = stage.finished if stage.finished is not None else time.monotonic() - self.t0
+            state = "failed" if stage.error is not None else "ok"
+            lines.append(f"boot: {stage.name} {end - stage.started:.2f}s ({stage.started:.2f}s -> {end:.2f}s) {state}")
+        for name, at in self.marks.items():
+            lines.append(f"boot: {name} at {at:.2f}s")
+        return lines
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+
+import threading
+import time
+from collections import deque
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+class CircuitBreaker:
+    """
+    Per-source circuit breaker, so one failing api doesn't take the others down.
+    Closed: polls go out as scheduled. After `failures` failed polls in a row it
+    opens: nothing is sent and the screens keep the last data, marked stale.
+    Once the probe interval has passed it goes half-open and lets one poll
+    through. Success closes it, failure opens it again with the interval
+    doubled, from probe_min up to probe_max.
+    """
+    def __init__(self, name, failures=5, probe_min=30, probe_max=1800, on_change=None):
+        self.name = name
+        self.failures = max(1, failures)
+        self.probe_min = probe_min
+        self.probe_max = probe_max
+        self.on_change = on_change  # on_change(breaker, old state, new state)
+        self.state = CLOSED
+        self.consecutive = 0  # failed polls in a row
+        self.probe_interval = probe_min
+        self.probe_at = 0.0  # monotonic, when an open breaker goes half-open
+        self.opened = 0
+        self.transitions = deque(maxlen=20)  # (wall time, old state, new state)
+        self._lock = threading.Lock()
+
+    def allow(self, now=None):
+        """May a poll go out now? An open breaker goes half-open once its probe is due."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if self.state == OPEN and now >= self.probe_at:
+                self._set(HALF_OPEN)
+            return self.state != OPEN
+
+    def wait(self, now=None):
+        """Seconds until an open breaker's next probe, 0 otherwise."""
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self.probe_at - (time.monotonic() if now is None else now))
+
+    def probe_now(self):
+        """An open breaker's probe is due right away (e.g. the clock or the network just came back)."""
+        with self._lock:
+            if self.state == OPEN:
+                self.probe_at = 0.0
+
+    def success(self):
+        with self._lock:
+            self.consecutive = 0
+            self.probe_interval = self.probe_min
+            if self.state != CLOSED:
+                self._set(CLOSED)
+
+    def failure(self, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self.consecutive += 1
+            if self.state == HALF_OPEN:
+                #the probe failed, wait twice as long for the next one
+                self.probe_interval = min(self.probe_max, self.probe_interval * 2)
+            elif self.state == OPEN or self.consecutive < self.failures:
+                return
+            self.probe_at = now + self.probe_interval
+            self.opened += 1
+            self._set(OPEN)
+
+    def _set(self, state):
+        old, self.state = self.state, state
+        self.transitions.append((time.time(), old, state))
+        if state == OPEN:
+            print(f"breaker {self.name}: {old} -> {state} after {self.consecutive} failures, probe in {self.probe_interval:.0f}s")
+        else:
+            print(f"breaker {self.name}: {old} -> {state}")
+        if self.on_change:
+            self.on_change(self, old, state)
+
+    def summary(self):
+        text = f"breaker {self.name}: {self.state}, {self.consecutive} failed in a row, opened {self.opened}x"
+        if self.state == OPEN:
+            text += f", probe in {self.wait():.0f}s"
+        return text
+
+
+def main():
+    #walk one breaker through open -> half-open -> open (doubled) -> closed
+    b = CircuitBreaker("demo", failures=3, probe_min=1, probe_max=4)
+    now = 0.0
+    for _ in range(3):
+        b.failure(now)
+    assert b.state == OPEN and not b.allow(now + 0.5)
+    assert b.allow(now + 1) and b.state == HALF_OPEN
+    b.failure(now + 1)
+    assert b.state == OPEN and b.probe_interval == 2 and not b.allow(now + 2.5)
+    assert b.allow(now + 3)
+    b.failure(now + 3)
+    b.probe_now()
+    assert b.allow(now + 3) and b.state == HALF_OPEN
+    b.success()
+    assert b.state == CLOSED and b.probe_interval == 1
+    print(b.summary())
+    for at, old, new in b.transitions:
+        print(f"  {old} -> {new}")
+
+if __name__ == "__main__":
+    main()
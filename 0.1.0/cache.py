@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+
+import mmap
+import os
+import struct
+import time
+from pathlib import Path
+
+CACHE_DIR = Path("/run/btcmon")
+MAGIC = b"BTCM"
+HEADER = struct.Struct("<4sHd")  # magic, version, fetched_at
+STATE_MAGIC = b"BTCS"
+STATE_HEADER = struct.Struct("<4sHdH")  # magic, version, saved_at, section count
+SECTION = struct.Struct("<8sHI")  # source name, its layout version, length
+COMMON = struct.Struct("<d")  # fetched_at
+
+
+class RecordCache:
+    """
+    One fixed-size struct-packed record per source on tmpfs.
+    Writes go to a temp file then os.replace(), so a reader never sees half a record.
+    Reads come from an mmap that is only re-opened when the file is replaced.
+    """
+    def __init__(self, name, fields, fmt, version=1, directory=None):
+        self.path = Path(directory or CACHE_DIR) / f"{name}.bin"
+        self.fields = tuple(fields)
+        self.body = struct.Struct("<" + fmt)
+        self.version = version
+        self.size = HEADER.size + self.body.size
+        self._map = None
+        self._key = None
+
+    def write(self, fetched_at=None, **values):
+        fetched_at = fetched_at or time.time()
+        record = HEADER.pack(MAGIC, self.version, fetched_at) + self.body.pack(*(values[f] for f in self.fields))
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "wb") as f:
+            f.write(record)
+        os.replace(tmp, self.path)
+
+    def _mapped(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        if st.st_size != self.size:
+            return None
+        key = (st.st_ino, st.st_mtime_ns)
+        if self._map is None or key != self._key:
+            if self._map is not None:
+                self._map.close()
+            with open(self.path, "rb") as f:
+                self._map = mmap.mmap(f.fileno(), self.size, access=mmap.ACCESS_READ)
+            self._key = key
+        return self._map
+
+    def read(self):
+        """Dict of the cached fields plus 'fetched_at', or None if missing/foreign/old version."""
+        try:
+            buf = self._mapped()
+        except (OSError, ValueError):
+            return None
+        if buf is None:
+            return None
+        magic, version, fetched_at = HEADER.unpack_from(buf, 0)
+        if magic != MAGIC or version != self.version:
+            return None
+        values = dict(zip(self.fields, self.body.unpack_from(buf, HEADER.size)))
+        values["fetched_at"] = fetched_at
+        return values
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+
+class StateFile:
+    """
+    Full state of every source (block index, fee history, price bars), not
+    just the last record, in one file on tmpfs. A restarted
+    process loads it to show the last screens straight away.
+    Each source's section carries its own layout version, so changing one
+    source's layout only drops that source on the next start.
+    """
+    def __init__(self, name="state", version=1, directory=None):
+        self.path = Path(directory or CACHE_DIR) / f"{name}.bin"
+        self.version = version
+
+    def save(self, sections, saved_at=None):
+        """sections: {source name: (layout version, bytes)}"""
+        parts = [STATE_HEADER.pack(STATE_MAGIC, self.version, saved_at or time.time(), len(sections))]
+        for name, (version, body) in sections.items():
+            parts.append(SECTION.pack(name.encode(), version, len(body)))
+            parts.append(body)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "wb") as f:
+            f.write(b"".join(parts))
+        os.replace(tmp, self.path)
+
+    def load(self):
+        """(saved_at, {source name: (layout version, bytes)}), or None if missing/foreign/old version/cut short."""
+        try:
+            buf = self.path.read_bytes()
+            magic, version, saved_at, count = STATE_HEADER.unpack_from(buf, 0)
+            if magic != STATE_MAGIC or version != self.version:
+                return None
+            sections = {}
+            offset = STATE_HEADER.size
+            for _ in range(count):
+                name, layout, length = SECTION.unpack_from(buf, offset)
+                offset += SECTION.size
+                body = buf[offset:offset + length]
+                if len(body) != length:
+                    return None
+                sections[name.rstrip(b"\0").decode()] = (layout, body)
+                offset += length
+        except (OSError, struct.error, UnicodeDecodeError):
+            return None
+        return saved_at, sections
+
+    def remove(self):
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def is_stale(fetched_at, max_age, now=None):
+    return not fetched_at or (now or time.time()) - fetched_at > max_age
+
+
+class CachedSource:
+    """
+    Stale-while-revalidate for a data source with a RecordCache in self.cache.
+    The source implements cache_values() -> dict and restore(record).
+    For a StateFile it also implements dump_state() -> bytes and
+    load_state(buf), bumping state_version whenever that layout changes.
+    """
+    max_age = 600  # seconds before data counts as stale even without an error
+    write_every = 10  # a fast websocket stream shouldn't rewrite the file every tick
+    fetched_at = 0.0
+    stale = True
+    _written_at = 0.0
+    state_version = 2
+
+    def load_cache(self):
+        record = self.cache.read()
+        if record is None:
+            return False
+        self.restore(record)
+        self.fetched_at = record["fetched_at"]
+        self.stale = True  # shown, but marked until revalidated
+        return True
+
+    def mark_fresh(self):
+        now = time.time()
+        self.fetched_at = now
+        self.stale = False
+        if now - self._written_at < self.write_every:
+            return
+        try:
+            self.cache.write(fetched_at=now, **self.cache_values())
+            self._written_at = now
+        except OSError as e:
+            print(f"Error writing {self.cache.path}: {e}")
+
+    def mark_failed(self):
+        #keep showing the last good values, flagged as stale
+        if not self.fetched_at:
+            self.load_cache()
+        self.stale = True
+
+    def is_stale(self, now=None):
+        return self.stale or is_stale(self.fetched_at, self.max_age, now)
+
+    def save_state(self):
+        """(layout version, bytes) of the whole state for a StateFile."""
+        return self.state_version, COMMON.pack(self.fetched_at) + self.dump_state()
+
+    def warm_start(self, version, buf):
+        """Load a save_state() section, shown stale until revalidated. False if it can't be used."""
+        if version != self.state_version:
+            return False
+        try:
+            fetched_at, = COMMON.unpack_from(buf, 0)
+            self.load_state(buf[COMMON.size:])
+        except (struct.error, ValueError, IndexError) as e:
+            print(f"Error loading saved state for {type(self).__name__}: {e}")
+            return False
+        #error counts aren't carried over: a restart after failures would come
+        #back already failing and back off (or exit) again straight away
+        self.fetched_at = fetched_at
+        self.stale = True
+        return True
@@ -6,7 +6,6 @@ import fcntl
 import struct
 import subprocess
 import time
-import requests
 from dataclasses import dataclass
 import json
 
@@ -20,11 +19,11 @@ def get_ip_address(ifname='wlan0'):
     except OSError:
         return None  # Interface not found or no IP assigned
         
-def ping_host(host="1.1.1.1", count=4):
+def ping_host(host="1.1.1.1", count=4, interval=0.2):
     try:
-        # Run the ping command
+        # Run the ping command, 0.2s apart (the shortest ping allows without root) instead of 1s
         result = subprocess.run(
-            ["ping", "-c", str(count), host],
+            ["ping", "-c", str(count), "-i", str(interval), host],
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             text=True
@@ -184,6 +183,8 @@ def systemd_timesyncd_ready(timeout=15, poll_interval=1):
 
 def get_timezone():
     try:
+        #only the timezone lookup uses requests directly, don't load it for every import
+        import requests
         url = f'http://ip-api.com/json'
         response = requests.get(url)
         data = response.json()
@@ -215,6 +216,19 @@ class Config:
     wait_config: int
     timezone: str
     api_failures: int
+    stream_mempool: int = 1
+    stream_price: int = 1
+    price_refresh: int = 5
+    host_budget: int = 12
+    fee_sparkline: int = 0
+    fee_window: int = 3600
+    price_screen: int = 0
+    price_sources: str = "kraken,coinbase,bitstamp"
+    price_quorum: int = 2
+    display: str = "i2c"
+    screens: str = "clock,fees"
+    screen_dwell: str = ""
+    warm_start: int = 900
     
 def create_default_config(path: str):
     default_config = {
@@ -225,7 +239,20 @@ def create_default_config(path: str):
         "block_splash": 1,
         "wait_config": 3,
         "timezone": "auto",
-        "api_failures": 20
+        "api_failures": 5,
+        "stream_mempool": 1,
+        "stream_price": 1,
+        "price_refresh": 5,
+        "host_budget": 12,
+        "fee_sparkline": 0,
+        "fee_window": 3600,
+        "price_screen": 0,
+        "price_sources": "kraken,coinbase,bitstamp",
+        "price_quorum": 2,
+        "display": "i2c",
+        "screens": "clock,fees",
+        "screen_dwell": "",
+        "warm_start": 900
     }
     with open(path, "w") as f:
         json.dump(default_config, f, indent=4)
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+
+import heapq
+import itertools
+import threading
+import time
+from dataclasses import dataclass, field, replace
+
+#overlay priorities, higher preempts lower
+SPLASH = 1
+ALERT = 2
+
+
+@dataclass
+class Frame:
+    line0: str
+    line1: str
+    center: bool = False
+    priority: int = 0  # 0 = ordinary screen frame
+    duration: float = 0.0  # overlays: seconds to hold on screen
+    key: str = None  # overlays with the same key coalesce
+    submitted: float = field(default_factory=time.monotonic)
+
+
+class Compositor:
+    """
+    Owns the LCD and is the only thread that writes to it.
+    Callers submit screen frames or timed overlays (splashes, alerts) and return
+    immediately. Screen frames coalesce to the latest one; overlays wait in a
+    bounded priority queue and hide screen frames while they're up.
+    Has the same output/center/justify calls as LCD, so screen handlers take either.
+    """
+    def __init__(self, lcd, max_pending=8):
+        self.lcd = lcd
+        self.cols = lcd.cols
+        self.rows = lcd.rows
+        self.max_pending = max_pending
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._pending = []  # heap of (-priority, seq, Frame)
+        self._base = None  # latest screen frame
+        self._base_dirty = False
+        self._overlay = None
+        self._overlay_until = 0.0
+        self._stop = False
+        self._thread = None
+        self.busy_since = None  # monotonic start of the LCD writes in progress, None while idle
+        #stats
+        self.drawn = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    # ---- caller side ----
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="compositor", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=2):
+        with self._cond:
+            self._stop = True
+            self._cond.notify()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def show(self, line0, line1, center=False):
+        """Submit a screen frame, replacing any frame not yet drawn."""
+        with self._cond:
+            if self._base_dirty:
+                self.coalesced += 1
+            self._base = Frame(line0, line1, center)
+            self._base_dirty = True
+            self._cond.notify()
+
+    def overlay(self, line0, line1, duration, priority=SPLASH, center=False, key=None):
+        """Queue a timed overlay. Returns False if it was dropped because the queue is full."""
+        frame = Frame(line0, line1, center, priority, duration, key)
+        with self._cond:
+            if key is not None:
+                for i, (_, _, f) in enumerate(self._pending):
+                    if f.key == key:
+                        self._pending[i] = (-priority, next(self._seq), frame)
+                        heapq.heapify(self._pending)
+                        self.coalesced += 1
+                        self._cond.notify()
+                        return True
+            if len(self._pending) >= self.max_pending:
+                lowest = max(self._pending)  # lowest priority, newest
+                if -lowest[0] > priority:
+                    self.dropped += 1
+                    return False
+                self._pending.remove(lowest)
+                heapq.heapify(self._pending)
+                self.dropped += 1
+            heapq.heappush(self._pending, (-priority, next(self._seq), frame))
+            self._cond.notify()
+        return True
+
+    # LCD-compatible surface: a sleep_time turns into an overlay instead of a sleep
+    def output(self, sleep_time=0, line0="", line1="", clear_line0=True, clear_line1=True):
+        if sleep_time:
+            self.overlay(line0, line1, float(sleep_time))
+        else:
+            self.show(line0, line1)
+
+    def center(self, sleep_time=0, line0="", line1="", clear_line0=True, clear_line1=True):
+        if sleep_time:
+            self.overlay(line0, line1, float(sleep_time), center=True)
+        else:
+            self.show(line0, line1, center=True)
+
+    def justify2(self, left, right):
+        return self.lcd.justify2(left, right)
+
+    def justify3(self, w1, w2, w3):
+        return self.lcd.justify3(w1, w2, w3)
+
+    def sparkline(self, levels):
+        return self.lcd.sparkline(levels)
+
+    def glyph(self, name):
+        return self.lcd.glyph(name)
+
+    def stats(self):
+        with self._cond:
+            avg = self.latency_total / self.drawn if self.drawn else 0.0
+            return {
+                "drawn": self.drawn,
+                "coalesced": self.coalesced,
+                "dropped": self.dropped,
+                "pending": len(self._pending),
+                "latency_avg_ms": avg * 1000,
+                "latency_max_ms": self.latency_max * 1000,
+            }
+
+    # ---- writer thread ----
+    def _next(self):
+        """Under the lock: (frame to draw or None, seconds to wait if nothing to do)."""
+        now = time.monotonic()
+        if self._overlay is not None and now >= self._overlay_until:
+            self._overlay = None
+            if self._base is not None:
+                #put the screen back, a redraw isn't new latency
+                self._base = replace(self._base, submitted=now)
+                self._base_dirty = True
+        if self._pending:
+            top = self._pending[0][2]
+            #a higher priority overlay cuts the current one short
+            if self._overlay is None or top.priority > self._overlay.priority:
+                heapq.heappop(self._pending)
+                self._overlay = top
+                self._overlay_until = now + top.duration
+                return top, None
+        if self._overlay is not None:
+            return None, self._overlay_until - now
+        if self._base_dirty:
+            self._base_dirty = False
+            return self._base, None
+        return None, None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._stop:
+                        return
+                    frame, wait = self._next()
+                    if frame is not None:
+                        break
+                    self._cond.wait(wait)
+            self.busy_since = time.monotonic()
+            self._draw(frame)
+            self.busy_since = None
+
+    def _draw(self, frame):
+        try:
+            if frame.center:
+                self.lcd.center(0, frame.line0, frame.line1)
+            else:
+                self.lcd.output(0, frame.line0, frame.line1)
+        except Exception as e:
+            print(f"Error drawing frame: {e}")
+            return
+        latency = time.monotonic() - frame.submitted
+        with self._cond:
+            self.drawn += 1
+            self.latency_total += latency
+            self.latency_max = max(self.latency_max, latency)
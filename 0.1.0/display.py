@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import time
+from collections import deque
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import LCD1602
+
+#BTCMON_DISPLAY overrides the config, e.g. BTCMON_DISPLAY=terminal python3 main.py
+ENV_VAR = "BTCMON_DISPLAY"
+
+#control bytes LCD1602 sends ahead of each byte
+CONTROL_COMMAND = 0x80
+CONTROL_DATA = 0x40
+
+#HD44780 execution times, clear and home are the slow ones
+EXEC_SLOW = 0.00152
+EXEC_FAST = 0.000037
+
+
+class EmulatedHD44780(LCD1602.FakeSMBus):
+    """
+    Stands in for the I2C bus and decodes what LCD1602 sends into HD44780 state:
+    DDRAM (2 x 40), CGRAM, address counter, entry mode and display shift.
+    Every command and data byte is logged with a timestamp, and bus time plus
+    controller execution time are added up, so render cost can be measured off-device.
+    """
+    def __init__(self, cols=16, rows=2, max_log=100000):
+        super().__init__()
+        self.cols = cols
+        self.rows = rows
+        self.ddram = [[0x20] * LCD1602.DDRAM_COLS for _ in range(2)]
+        self.cgram = [0] * 64
+        self.addr = 0
+        self.in_cgram = False
+        self.increment = True
+        self.shift = 0  # display window offset, cells moved left
+        self.display_on = False
+        self.commands = 0
+        self.data_bytes = 0
+        self.exec_secs = 0.0
+        self.log = deque(maxlen=max_log)  # (perf_counter, "cmd" or "data", byte)
+
+    # ---- bus side, what LCD1602 calls ----
+    def write_byte_data(self, addr, reg, value):
+        super().write_byte_data(addr, reg, value)
+        self._feed(reg, [value])
+
+    def write_i2c_block_data(self, addr, reg, values):
+        super().write_i2c_block_data(addr, reg, values)
+        self._feed(reg, values)
+
+    def _feed(self, reg, values):
+        now = time.perf_counter()
+        for value in values:
+            if reg == CONTROL_COMMAND:
+                self.log.append((now, "cmd", value))
+                self.command(value)
+            else:
+                self.log.append((now, "data", value))
+                self.data(value)
+        self.changed()
+
+    # ---- controller ----
+    def command(self, cmd):
+        self.commands += 1
+        self.exec_secs += EXEC_SLOW if cmd in (LCD1602.LCD_CLEARDISPLAY, LCD1602.LCD_RETURNHOME) else EXEC_FAST
+        if cmd & LCD1602.LCD_SETDDRAMADDR:
+            self.in_cgram = False
+            self.addr = cmd & 0x7F
+        elif cmd & LCD1602.LCD_SETCGRAMADDR:
+            self.in_cgram = True
+            self.addr = cmd & 0x3F
+        elif cmd & LCD1602.LCD_FUNCTIONSET:
+            pass
+        elif cmd & LCD1602.LCD_CURSORSHIFT:
+            step = 1 if cmd & LCD1602.LCD_MOVERIGHT else -1
+            if cmd & LCD1602.LCD_DISPLAYMOVE:
+                self.shift = (self.shift - step) % LCD1602.DDRAM_COLS
+            else:
+                self._advance(step)
+        elif cmd & LCD1602.LCD_DISPLAYCONTROL:
+            self.display_on = bool(cmd & LCD1602.LCD_DISPLAYON)
+        elif cmd & LCD1602.LCD_ENTRYMODESET:
+            self.increment = bool(cmd & LCD1602.LCD_ENTRYLEFT)
+        elif cmd & LCD1602.LCD_RETURNHOME:
+            self.addr, self.shift, self.in_cgram = 0, 0, False
+        elif cmd & LCD1602.LCD_CLEARDISPLAY:
+            self.ddram = [[0x20] * LCD1602.DDRAM_COLS for _ in range(2)]
+            self.addr, self.shift, self.in_cgram, self.increment = 0, 0, False, True
+
+    def data(self, value):
+        self.data_bytes += 1
+        self.exec_secs += EXEC_FAST
+        if self.in_cgram:
+            self.cgram[self.addr] = value & 0x1F
+            self.addr = (self.addr + 1) & 0x3F
+            return
+        row, col = divmod(self.addr, 0x40)
+        if col < LCD1602.DDRAM_COLS:
+            self.ddram[row & 1][col] = value
+        self._advance(1 if self.increment else -1)
+
+    def _advance(self, step):
+        #DDRAM addresses run 0x00-0x27 then 0x40-0x67 and wrap
+        row, col = divmod(self.addr, 0x40)
+        col += step
+        if col >= LCD1602.DDRAM_COLS:
+            row, col = (row + 1) & 1, 0
+        elif col < 0:
+            row, col = (row - 1) & 1, LCD1602.DDRAM_COLS - 1
+        self.addr = row * 0x40 + col
+
+    def changed(self):
+        pass
+
+    # ---- inspection ----
+    def lines(self):
+        """Visible text; CGRAM characters come back as chr(0)-chr(7)."""
+        width = LCD1602.DDRAM_COLS
+        return ["".join(chr(self.ddram[row][(col + self.shift) % width]) for col in range(self.cols))
+                for row in range(self.rows)]
+
+    def glyph(self, slot):
+        return self.cgram[slot * 8:slot * 8 + 8]
+
+    def reset_counters(self):
+        self.transactions = 0
+        self.bus_secs = 0.0
+        self.exec_secs = 0.0
+        self.commands = 0
+        self.data_bytes = 0
+        self.log.clear()
+
+
+class TerminalHD44780(EmulatedHD44780):
+    """The emulator, drawn in the terminal whenever the visible text changes."""
+    BARS = " ▁▂▃▄▅▆▇█"
+
+    def __init__(self, cols=16, rows=2, out=None):
+        super().__init__(cols, rows, max_log=1000)
+        self.out = out or sys.stdout
+        self.shown = None
+        self.tty = self.out.isatty()
+
+    def _cell(self, ch):
+        code = ord(ch)
+        if code >= 8:
+            return ch
+        rows = self.glyph(code)
+        lit = [r for r in rows if r]
+        #bottom-aligned solid rows are a bar glyph, anything else gets a shade
+        if lit and rows[-1] and all(r == 0x1F for r in lit):
+            return self.BARS[len(lit)]
+        return "▒" if lit else " "
+
+    def changed(self):
+        if not self.display_on:
+            return
+        lines = ["".join(self._cell(ch) for ch in line) for line in self.lines()]
+        if lines == self.shown:
+            return
+        border = "+" + "-" * self.cols + "+"
+        frame = [border] + [f"|{line}|" for line in lines] + [border]
+        if self.tty and self.shown is not None:
+            #redraw in place
+            self.out.write(f"\x1b[{len(frame)}F")
+        self.out.write("\n".join(frame) + "\n")
+        self.out.flush()
+        self.shown = lines
+
+
+def open_bus(name=None, cols=16, rows=2):
+    """Bus for LCD1602: 'i2c' (the real display), 'emulator' or 'terminal'."""
+    name = (os.environ.get(ENV_VAR) or name or "i2c").lower()
+    if name == "i2c":
+        return LCD1602.default_bus()
+    if name == "emulator":
+        return EmulatedHD44780(cols, rows)
+    if name == "terminal":
+        return TerminalHD44780(cols, rows)
+    raise ValueError(f"unknown display backend: {name}")
+
+
+def benchmark(frames=300):
+    """Bus and controller cost per frame for the regular screens, measured on the emulator."""
+    from lcd import LCD
+
+    lcd = LCD(backend="emulator")
+    bus = lcd.bus
+    screens = []
+    for i in range(frames):
+        minute = i // 60
+        screens.append((f"12:{minute:02d} 10-18-2026", f"${67000 + i % 7:.2f}^   L24"))
+        screens.append(("870123", f"sat/vB  H{12 + i % 3} M9 L4"))
+    bus.reset_counters()
+    start = time.perf_counter()
+    for line0, line1 in screens:
+        lcd.output(0, line0, line1)
+    wall = time.perf_counter() - start
+    n = len(screens)
+    print(f"{bus.transactions / n:.2f} transactions/frame, {bus.data_bytes / n:.2f} data bytes, {bus.commands / n:.2f} commands")
+    print(f"{bus.bus_secs / n * 1000:.3f} ms bus + {bus.exec_secs / n * 1000:.3f} ms controller per frame, {wall / n * 1e6:.0f} us python")
+    assert bus.lines() == [line.ljust(16)[:16] for line in screens[-1]], bus.lines()
+    return bus
+
+
+def main():
+    benchmark()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+
+import heapq
+import itertools
+import os
+import selectors
+import threading
+import time
+from collections import deque
+import ticks
+
+#far enough ahead that the clock-change timer never actually fires
+_FAR = 10 * 365 * 86400
+
+
+class Timer:
+    def __init__(self, when, fn, args, wall=None):
+        self.when = when  # monotonic
+        self.wall = wall  # wall-clock deadline, re-mapped when the clock jumps
+        self.fn = fn
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class EventLoop(ticks.TickScheduler):
+    """
+    Single-threaded loop on a selector: timers, fd readiness and callbacks
+    handed over from other threads through a wakeup pipe. It only wakes when a
+    timer is due, an fd is readable or another thread calls in.
+    The waiting is TickScheduler.sleep_until with the selector as its wait, so
+    a clock step ends it and wall-clock timers are worked out again.
+    Steps are caught with a CLOCK_REALTIME timerfd armed with
+    TFD_TIMER_CANCEL_ON_SET where Python has it (3.13+); elsewhere the select
+    timeout is capped at max_sleep and the offset is checked on each wake.
+    """
+    def __init__(self, max_sleep=30):
+        super().__init__(max_sleep)
+        self.selector = selectors.DefaultSelector()
+        self.on_clock_jump = []  # callbacks after a clock step, wall timers are already re-mapped
+        self._timers = []  # heap of (when, seq, Timer)
+        self._seq = itertools.count()
+        self._calls = deque()
+        self._lock = threading.Lock()
+        self._stop = False
+        self.busy_since = None  # monotonic start of the callbacks being run, None while waiting
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_r, False)
+        os.set_blocking(self._wake_w, False)
+        self.selector.register(self._wake_r, selectors.EVENT_READ, self._drain)
+        self._clock_fd = self._clock_timerfd()
+        if self._clock_fd is not None:
+            self.max_sleep = None  # the timerfd wakes us on a step
+        #stats, wakeups and jumps are counted by TickScheduler
+        self.cpu_started = time.process_time()
+        self.timers_fired = 0
+        self.fd_events = 0
+
+    # ---- scheduling ----
+    def call_at(self, when, fn, *args):
+        """Run fn(*args) at monotonic time `when`."""
+        timer = Timer(when, fn, args)
+        heapq.heappush(self._timers, (when, next(self._seq), timer))
+        return timer
+
+    def call_later(self, delay, fn, *args):
+        return self.call_at(time.monotonic() + delay, fn, *args)
+
+    def call_at_wall(self, wall, fn, *args):
+        """Run fn(*args) at wall-clock time `wall`, still on time if the clock is stepped meanwhile."""
+        timer = Timer(self.to_monotonic(wall), fn, args, wall)
+        heapq.heappush(self._timers, (timer.when, next(self._seq), timer))
+        return timer
+
+    def call_soon_threadsafe(self, fn, *args):
+        """Hand fn(*args) to the loop from any thread."""
+        with self._lock:
+            self._calls.append((fn, args))
+        try:
+            os.write(self._wake_w, b"\0")
+        except BlockingIOError:
+            pass  # pipe full, the loop is waking anyway
+
+    def add_reader(self, fileobj, fn, *args):
+        self.selector.register(fileobj, selectors.EVENT_READ, lambda: fn(*args))
+
+    def remove_reader(self, fileobj):
+        self.selector.unregister(fileobj)
+
+    def stop(self):
+        self.call_soon_threadsafe(self._set_stop)
+
+    def _set_stop(self):
+        self._stop = True
+
+    # ---- clock steps ----
+    def _clock_timerfd(self):
+        if not hasattr(os, "timerfd_create"):
+            return None
+        try:
+            fd = os.timerfd_create(time.CLOCK_REALTIME, flags=os.TFD_NONBLOCK | os.TFD_CLOEXEC)
+            self._arm_clock(fd)
+        except OSError as e:
+            print(f"No clock-change timerfd, polling for clock jumps: {e}")
+            return None
+        self.selector.register(fd, selectors.EVENT_READ, self._clock_changed)
+        return fd
+
+    def _arm_clock(self, fd):
+        os.timerfd_settime(fd, flags=os.TFD_TIMER_ABSTIME | os.TFD_TIMER_CANCEL_ON_SET, initial=time.time() + _FAR)
+
+    def _clock_changed(self):
+        try:
+            os.read(self._clock_fd, 8)
+        except OSError:
+            pass  # ECANCELED: the clock was set
+        self._arm_clock(self._clock_fd)
+
+    def _retime(self):
+        retimed = []
+        for _, _, timer in self._timers:
+            if timer.wall is not None:
+                timer.when = self.to_monotonic(timer.wall)
+            retimed.append((timer.when, next(self._seq), timer))
+        heapq.heapify(retimed)
+        self._timers = retimed
+        for fn in self.on_clock_jump:
+            fn()
+
+    # ---- running ----
+    def _drain(self):
+        try:
+            while os.read(self._wake_r, 512):
+                pass
+        except BlockingIOError:
+            pass
+
+    def _deadline(self):
+        """Wall time of the next timer, now if callbacks are waiting, None if nothing is scheduled."""
+        while self._timers and self._timers[0][2].cancelled:
+            heapq.heappop(self._timers)
+        if self._calls:
+            return time.time()
+        return self._timers[0][0] + self.offset if self._timers else None
+
+    def run_once(self):
+        events = []
+
+        def wait(timeout):
+            events.extend(self.selector.select(timeout))
+            return bool(events)
+
+        woke = self.sleep_until(self._deadline(), wait)
+        self.busy_since = time.monotonic()
+        for key, _ in events:
+            self.fd_events += 1
+            key.data()
+        if woke == "jumped":
+            self._retime()
+        with self._lock:
+            calls, self._calls = self._calls, deque()
+        for fn, args in calls:
+            fn(*args)
+        now = time.monotonic()
+        while self._timers and self._timers[0][0] <= now:
+            _, _, timer = heapq.heappop(self._timers)
+            if not timer.cancelled:
+                self.timers_fired += 1
+                timer.fn(*timer.args)
+        self.busy_since = None
+
+    def run(self):
+        """Run until stop(). Exceptions from callbacks propagate out."""
+        while not self._stop:
+            self.run_once()
+
+    def report(self):
+        minutes = max(1 / 60, (time.monotonic() - self.started) / 60)
+        cpu = time.process_time() - self.cpu_started
+        return [f"loop: {self.wakeups / minutes:.1f} wakeups/min ({self.timers_fired} timers, {self.fd_events} fd events), "
+                f"{cpu / minutes * 60:.2f} cpu s/hour, {self.jumps} clock jumps"]
+
+
+def main():
+    #idle cost: a minute-aligned timer plus a thread poking the loop every 5s
+    loop = EventLoop()
+    seconds = 20
+
+    def minute():
+        print(f"minute boundary {time.strftime('%H:%M:%S')}")
+        loop.call_at_wall(ticks.next_boundary(60), minute)
+
+    def poke():
+        while not done.wait(5):
+            loop.call_soon_threadsafe(lambda: None)
+
+    done = threading.Event()
+    threading.Thread(target=poke, daemon=True).start()
+    loop.call_at_wall(ticks.next_boundary(60), minute)
+    loop.call_later(seconds, loop.stop)
+    loop.run()
+    done.set()
+    for line in loop.report():
+        print(line)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+
+import time
+import threading
+from collections import namedtuple
+
+#vwap is None for exchanges that don't publish one
+Quote = namedtuple("Quote", ["source", "vwap", "bid", "ask"])
+
+
+def _kraken(raw):
+    data = raw["result"]["XXBTZUSD"]
+    return float(data["p"][1]), float(data["b"][0]), float(data["a"][0])
+
+def _coinbase(raw):
+    return None, float(raw["bid"]), float(raw["ask"])
+
+def _bitstamp(raw):
+    return float(raw["vwap"]), float(raw["bid"]), float(raw["ask"])
+
+def _gemini(raw):
+    return None, float(raw["bid"]), float(raw["ask"])
+
+def _bitfinex(raw):
+    #[BID, BID_SIZE, ASK, ASK_SIZE, ...]
+    return None, float(raw[0]), float(raw[2])
+
+
+EXCHANGES = {
+    "kraken": ("https://api.kraken.com/0/public/Ticker?pair=XBTUSD", _kraken),
+    "coinbase": ("https://api.exchange.coinbase.com/products/BTC-USD/ticker", _coinbase),
+    "bitstamp": ("https://www.bitstamp.net/api/v2/ticker/btcusd/", _bitstamp),
+    "gemini": ("https://api.gemini.com/v1/pubticker/btcusd", _gemini),
+    "bitfinex": ("https://api-pub.bitfinex.com/v2/ticker/tBTCUSD", _bitfinex),
+}
+
+
+class Exchange:
+    def __init__(self, name, url=None, parse=None):
+        default_url, default_parse = EXCHANGES.get(name, (None, None))
+        self.name = name
+        self.url = url or default_url
+        self.parse = parse or default_parse
+        if not self.url or not self.parse:
+            raise ValueError(f"unknown exchange: {name}")
+        self.health = Health()
+
+    def quote(self, http):
+        start = time.monotonic()
+        try:
+            resp = http.get(self.url)
+            resp.raise_for_status()
+            vwap, bid, ask = self.parse(resp.json())
+        except Exception:
+            self.health.failed()
+            raise
+        self.health.ok(time.monotonic() - start)
+        return Quote(self.name, vwap, bid, ask)
+
+
+class Health:
+    """Per-exchange success/failure counts and latency, plus a cool-down after repeated failures."""
+    def __init__(self, fails_to_rest=3, rest_secs=300):
+        self.ok_count = 0
+        self.fail_count = 0
+        self.consecutive_fails = 0
+        self.latency = None  # moving average, seconds
+        self.resting_until = 0.0
+        self.fails_to_rest = fails_to_rest
+        self.rest_secs = rest_secs
+        self._lock = threading.Lock()
+
+    def ok(self, latency):
+        with self._lock:
+            self.ok_count += 1
+            self.consecutive_fails = 0
+            self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+
+    def failed(self):
+        with self._lock:
+            self.fail_count += 1
+            self.consecutive_fails += 1
+            if self.consecutive_fails >= self.fails_to_rest:
+                self.resting_until = time.monotonic() + self.rest_secs
+
+    def available(self):
+        return time.monotonic() >= self.resting_until
+
+    def summary(self):
+        latency = f"{self.latency * 1000:.0f}ms" if self.latency is not None else "-"
+        state = "up" if self.available() else "resting"
+        return f"{self.ok_count} ok, {self.fail_count} fail, {latency}, {state}"
+
+
+def median(values):
+    values = sorted(values)
+    n = len(values)
+    if not n:
+        return None
+    mid = n // 2
+    return values[mid] if n % 2 else (values[mid - 1] + values[mid]) / 2
+
+
+def parse_sources(text):
+    """'kraken, coinbase' -> [Exchange, Exchange], unknown names are skipped with a warning."""
+    out = []
+    for name in (n.strip().lower() for n in str(text).split(",")):
+        if not name:
+            continue
+        try:
+            out.append(Exchange(name))
+        except ValueError as e:
+            print(e)
+    return out
@@ -1,28 +1,100 @@
 #!/usr/bin/env python3
 
-import requests
+import math
+import struct
+import time
+import transport
+from cache import RecordCache, CachedSource
+from history import RingBuffer, levels
 
-class FeeStats:
-    def __init__(self):
+def _num(v):
+    #"?" placeholders are cached as NaN
+    if isinstance(v, float):
+        if math.isnan(v):
+            return "?"
+        return int(v) if v.is_integer() else v
+    return v
+
+STATE = struct.Struct("<4f")  # fastest, half_hour, hour, economy, then the history dump
+SPARK_LEVELS = 7  # bar glyphs, the 8th CGRAM slot stays free for the rising/falling arrow
+
+def _float(v):
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return math.nan
+
+class FeeStats(CachedSource):
+    def __init__(self, http=None, history_size=1440, sample_every=60, spark_window=3600, spark_width=10):
+        self.http = http or transport.shared()
+        #one sample a minute, 1440 = 24h in ~28KB that never grows
+        self.history = RingBuffer(history_size, ("fastest", "half_hour", "hour"))
+        self.sample_every = sample_every
+        self.spark_window = spark_window
+        self.spark_width = spark_width
         self.fastest = "?"
         self.half_hour = "?"
         self.hour = "?"
         self.economy = "?"
         self.request_error_count = 0
+        self.cache = RecordCache("fees", ("fastest", "half_hour", "hour", "economy"), "ffff")
+        self.load_cache()
+
+    def cache_values(self):
+        return {k: _float(getattr(self, k)) for k in self.cache.fields}
+
+    def restore(self, record):
+        for k in self.cache.fields:
+            setattr(self, k, _num(record[k]))
+
+    def dump_state(self):
+        return STATE.pack(*self.cache_values().values()) + self.history.dump()
+
+    def load_state(self, buf):
+        values = STATE.unpack_from(buf, 0)
+        self.history.load(buf, STATE.size)
+        for k, v in zip(self.cache.fields, values):
+            setattr(self, k, _num(v))
+
+    def apply(self, fees):
+        """Take a recommended-fees dict (REST or the websocket 'fees' push)."""
+        self.fastest = fees.get("fastestFee", "?")
+        self.half_hour = fees.get("halfHourFee", "?")
+        self.hour = fees.get("hourFee", "?")
+        self.economy = fees.get("economyFee", "?")
+        self.request_error_count = 0
+        self.success = True
+        self.mark_fresh()
+        self.record()
+
+    def record(self, now=None):
+        now = now or time.time()
+        if self.history and now - self.history.last_time() < self.sample_every:
+            return
+        try:
+            self.history.append(now, float(self.fastest), float(self.half_hour), float(self.hour))
+        except (TypeError, ValueError):
+            pass  # "?" placeholders aren't samples
+
+    def spark(self, now=None):
+        """Bar levels of the fastest fee across spark_window, oldest first."""
+        return levels(self.history.bins(self.spark_window, self.spark_width, "fastest", now), SPARK_LEVELS)
+
+    def slope(self, now=None):
+        """Fastest fee change in sat/vB per hour over spark_window."""
+        stats = self.history.stats(self.spark_window, "fastest", now)
+        return stats["slope"] if stats else 0.0
 
     def update(self):
         try:
-            fees = requests.get("https://mempool.space/api/v1/fees/recommended").json()
-            self.fastest = fees.get("fastestFee", "?")
-            self.half_hour = fees.get("halfHourFee", "?")
-            self.hour = fees.get("hourFee", "?")
-            self.economy = fees.get("economyFee", "?")
-            self.request_error_count = 0
-            self.success = True
+            r = self.http.get("https://mempool.space/api/v1/fees/recommended")
+            r.raise_for_status()
+            self.apply(r.json())
         except Exception as e:
             self.success = False
             self.request_error_count += 1
             print(f"Error fetching fees: {e}")
+            self.mark_failed()
 
 
 def main():
@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
+
+from scheduler import AdaptiveScheduler
+from transport import Counting, host_of
+from breaker import CircuitBreaker, OPEN
+
+
+@dataclass(frozen=True)
+class BlockSnapshot:
+    hash: str = None
+    timestamp: int = 0
+    height: int = 0
+    interval: float = None  # mean seconds between the indexed blocks
+    stale: bool = True
+    success: bool = False
+    request_error_count: int = 0
+
+    @classmethod
+    def of(cls, block_now):
+        return cls(
+            hash=block_now.hash,
+            timestamp=block_now.timestamp,
+            height=block_now.height,
+            interval=block_now.avg_interval(),
+            stale=block_now.is_stale(),
+            success=getattr(block_now, "success", False),
+            request_error_count=block_now.request_error_count,
+        )
+
+
+@dataclass(frozen=True)
+class FeeSnapshot:
+    fastest: object = "?"
+    half_hour: object = "?"
+    hour: object = "?"
+    economy: object = "?"
+    spark: tuple = ()
+    slope: float = 0.0
+    stale: bool = True
+    success: bool = False
+    request_error_count: int = 0
+
+    @classmethod
+    def of(cls, fees_now):
+        return cls(
+            fastest=fees_now.fastest,
+            half_hour=fees_now.half_hour,
+            hour=fees_now.hour,
+            economy=fees_now.economy,
+            spark=fees_now.spark(),
+            slope=fees_now.slope(),
+            stale=fees_now.is_stale(),
+            success=getattr(fees_now, "success", False),
+            request_error_count=fees_now.request_error_count,
+        )
+
+
+@dataclass(frozen=True)
+class PriceSnapshot:
+    price: float = 0.0
+    trend: str = "-"
+    change_1h: float = None
+    change_24h: float = None
+    change_7d: float = None
+    stale: bool = True
+    success: bool = False
+    request_error_count: int = 0
+
+    @classmethod
+    def of(cls, price_now):
+        return cls(
+            price=price_now.price,
+            trend=price_now.trend,
+            change_1h=price_now.change_1h,
+            change_24h=price_now.change_24h,
+            change_7d=price_now.change_7d,
+            stale=price_now.is_stale(),
+            success=getattr(price_now, "success", False),
+            request_error_count=price_now.request_error_count,
+        )
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """Everything the screens need, frozen at publish time. Safe to read from any thread."""
+    block: BlockSnapshot = BlockSnapshot()
+    fees: FeeSnapshot = FeeSnapshot()
+    price: PriceSnapshot = PriceSnapshot()
+    blocks_seen: int = 0
+    published_at: float = 0.0
+
+
+def _sooner(wait, seconds):
+    return seconds if wait is None else min(wait, seconds)
+
+
+class Source:
+    def __init__(self, name, obj, interval, freeze, hosts, block_aware=False, failures=5):
+        self.name = name
+        self.obj = obj
+        self.interval = interval
+        self.freeze = freeze
+        self.hosts = tuple(hosts)  # hosts a poll asks, each admitted against its own budget
+        self.block_aware = block_aware
+        self.next_due = 0.0
+        self.in_flight = False
+        self.started = 0.0  # monotonic time the poll in flight was handed to the pool
+        self.breaker = CircuitBreaker(name, failures)
+        self.streaming = False
+        self.throttle = 0.0  # min seconds between pushed publishes
+        self.last_push = 0.0
+        self.fetched = 0.0  # monotonic time of the last finished poll
+        self.dirty = False
+        self.lock = threading.Lock()  # serializes update() and pushed changes to obj
+        self.saved = None  # last obj.save_state(), reused while a fetch holds the lock
+        self.http = None  # Counting wrapper around obj.http
+        self.charged = {}  # host -> of http.sent there, how many its budget was charged for
+
+    def period(self, scheduler, block, stream_factor):
+        errors = getattr(self.obj, "request_error_count", 0) if not getattr(self.obj, "success", True) else 0
+        if self.block_aware:
+            period = scheduler.interval(self.interval, errors, block.timestamp, block_interval=block.interval)
+        else:
+            period = scheduler.interval(self.interval, errors)
+        #while a push stream is live, polling is only a slow sanity check
+        return period * stream_factor if self.streaming else period
+
+
+class FetchEngine:
+    """
+    Runs every data source's update() on a small worker pool in the background.
+    The render loop only ever calls snapshot(), which never touches the network.
+    """
+    def __init__(self, config, block_now, fees_now, price_now, workers=3, stream_factor=6, scheduler=None):
+        #each source has its own circuit breaker: a kraken outage leaves mempool.space polling
+        failures = config.api_failures
+        self.sources = {
+            "block": Source("block", block_now, config.wait_meta, BlockSnapshot.of, ["mempool.space"], block_aware=True, failures=failures),
+            "fees": Source("fees", fees_now, config.wait_meta, FeeSnapshot.of, ["mempool.space"], block_aware=True, failures=failures),
+            #price asks every exchange at once, OHLC bars are charged to kraken's host after the poll
+            "price": Source("price", price_now, config.wait_price, PriceSnapshot.of,
+                            dict.fromkeys(host_of(ex.url) for ex in price_now.exchanges), failures=failures),
+        }
+        self.scheduler = scheduler or AdaptiveScheduler(host_budget=config.host_budget)
+        for src in self.sources.values():
+            self.scheduler.register(src.name, src.interval)
+            #a poll can send several requests (block fetches the list when the tip moved,
+            #price asks every exchange), the budget is charged for each of them
+            if getattr(src.obj, "http", None) is not None:
+                src.obj.http = src.http = Counting(src.obj.http)
+        self.stream_factor = stream_factor
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fetch")
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        #whatever the caches hold is visible (marked stale) before the first fetch lands
+        self._snapshot = Snapshot(
+            block=BlockSnapshot.of(block_now),
+            fees=FeeSnapshot.of(fees_now),
+            price=PriceSnapshot.of(price_now),
+        )
+        self._thread = None
+        self.started = time.monotonic()
+        self.wakeups = 0  # passes of the scheduler thread
+        self.on_publish = None  # called (from a fetch/stream thread) after each new snapshot
+        self.wanted = None  # source name -> max age the screens accept, None polls everything
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name="fetch-engine", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def snapshot(self):
+        return self._snapshot
+
+    def refresh_now(self, *names):
+        """Make the named sources (or all of them) due on the next scheduler pass."""
+        with self._lock:
+            for name in names or self.sources:
+                self.sources[name].next_due = 0.0
+                #an open breaker would otherwise hold the poll back until its probe
+                self.sources[name].breaker.probe_now()
+        self._wake.set()
+
+    def push(self, name, apply):
+        """
+        Apply pushed data to a source (apply(obj)) and publish it right away,
+        unless the source's throttle window hasn't passed yet. Then the latest
+        value is held and published by the scheduler once the window opens.
+        """
+        src = self.sources[name]
+        with src.lock:
+            apply(src.obj)
+            src.dirty = True
+            #pushed data means the source is up, whatever the last poll said
+            src.breaker.success()
+            if time.monotonic() - src.last_push < src.throttle:
+                self._wake.set()
+                return
+        self._flush(src)
+
+    def throttle(self, name, seconds):
+        self.sources[name].throttle = seconds
+
+    def _flush(self, src):
+        with src.lock:
+            if not src.dirty:
+                return
+            src.dirty = False
+            src.last_push = time.monotonic()
+            frozen = src.freeze(src.obj)
+        self._publish(src, frozen, polled=False)
+
+    def save_state(self):
+        """
+        {name: obj.save_state()} for a StateFile. Never waits on a fetch in
+        progress: a busy source hands in the state it had last time.
+        """
+        for src in self.sources.values():
+            if src.lock.acquire(blocking=False):
+                try:
+                    src.saved = src.obj.save_state()
+                finally:
+                    src.lock.release()
+        return {src.name: src.saved for src in self.sources.values() if src.saved is not None}
+
+    def busy_since(self):
+        """When the oldest poll still in flight was sent, None if there is none. Lock free, for a Watchdog."""
+        started = [src.started for src in list(self.sources.values()) if src.in_flight]
+        return min(started, default=None)
+
+    def report(self):
+        minutes = max(1 / 60, (time.monotonic() - self.started) / 60)
+        return [f"fetch: {self.wakeups / minutes:.1f} wakeups/min"] + [src.breaker.summary() for src in self.sources.values()]
+
+    def want(self, needs):
+        """
+        Only poll the sources in needs ({name: max age in seconds}), the ones the
+        current and next screens show. Any of them older than its max age is
+        fetched right away. None goes back to polling everything.
+        """
+        with self._lock:
+            self.wanted = None if needs is None else dict(needs)
+            now = time.monotonic()
+            for name, max_age in (needs or {}).items():
+                src = self.sources[name]
+                if now - max(src.fetched, src.last_push) > max_age:
+                    src.next_due = min(src.next_due, now)
+        self._wake.set()
+
+    def set_streaming(self, state, *names):
+        """Stretch (or restore) polling for sources a live push stream is covering."""
+        with self._lock:
+            for name in names:
+                src = self.sources[name]
+                src.streaming = state
+                if not state:
+                    #stream dropped: fall straight back to polling
+                    src.next_due = 0.0
+                    src.breaker.probe_now()
+        self._wake.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            now = time.monotonic()
+            #sleep until the earliest due poll, probe or throttle window; pushes,
+            #want(), refreshes and finished polls all set _wake, so nothing is missed
+            wait = None
+            flush = []
+            with self._lock:
+                for src in self.sources.values():
+                    if src.dirty:
+                        opens = src.last_push + src.throttle
+                        if now >= opens:
+                            flush.append(src)
+                        else:
+                            wait = _sooner(wait, opens - now)
+                    if src.in_flight:
+                        continue
+                    if self.wanted is not None and src.name not in self.wanted:
+                        continue  # no screen coming up shows it
+                    was_open = src.breaker.state == OPEN
+                    if not src.breaker.allow(now):
+                        wait = _sooner(wait, src.breaker.wait(now))
+                        continue  # the screens keep its last data, marked stale
+                    if was_open:
+                        #half-open: the probe goes out now, not when the error backoff would poll
+                        src.next_due = min(src.next_due, now)
+                    if now >= src.next_due:
+                        defer = self.scheduler.admit(src.name, src.hosts, now)
+                        if defer:
+                            src.next_due = now + defer
+                            wait = _sooner(wait, defer)
+                            continue
+                        src.started = now
+                        for host in src.hosts:
+                            src.charged[host] = src.charged.get(host, 0) + 1
+                        src.in_flight = True
+                        self.pool.submit(self._run, src)
+                    else:
+                        wait = _sooner(wait, src.next_due - now)
+            for src in flush:
+                self._flush(src)
+            self._wake.wait(None if wait is None else max(0.05, wait))
+            self.wakeups += 1
+            self._wake.clear()
+
+    def _run(self, src):
+        with src.lock:
+            try:
+                src.obj.update()
+                ok = getattr(src.obj, "success", True)
+            except Exception as e:
+                print(f"Error updating {src.name}: {e}")
+                ok = False
+            frozen = src.freeze(src.obj)
+        if ok:
+            src.breaker.success()
+        else:
+            src.breaker.failure()
+        self._charge(src)
+        self._publish(src, frozen)
+
+    def _charge(self, src):
+        """Charge each host the requests a poll sent beyond what admit() took (late hedged quotes count next time)."""
+        if src.http is None:
+            return
+        with self._lock:
+            sent = dict(src.http.sent)
+            for host, count in sent.items():
+                if count > src.charged.get(host, 0):
+                    self.scheduler.charge(src.name, host, count - src.charged.get(host, 0))
+            src.charged = sent
+
+    def _publish(self, src, frozen, polled=True):
+        with self._lock:
+            snap = self._snapshot
+            if src.name == "block":
+                new_block = frozen.hash is not None and frozen.hash != snap.block.hash
+                snap = replace(snap, block=frozen, blocks_seen=snap.blocks_seen + int(new_block and snap.block.hash is not None))
+            else:
+                snap = replace(snap, **{src.name: frozen})
+            self._snapshot = replace(snap, published_at=time.time())
+            if polled:
+                src.in_flight = False
+                src.fetched = time.monotonic()
+                src.next_due = time.monotonic() + src.period(self.scheduler, snap.block, self.stream_factor)
+        self._wake.set()
+        if self.on_publish:
+            self.on_publish()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+
+from collections import OrderedDict
+
+#Frames refer to glyphs by name through a private-use character per glyph, so
+#justify/center still count one cell per glyph and the CGRAM slot is only
+#picked when the frame is drawn.
+REF_BASE = 0xE000
+CGRAM_SLOTS = 8
+
+_names = []  # ref index -> name
+_glyphs = {}  # name -> (rows, fallback)
+
+
+def register(name, rows, fallback="?"):
+    """Register a named 5x8 glyph: 8 row bytes, low 5 bits used. fallback is shown if no slot is free."""
+    rows = bytes(r & 0x1F for r in rows[:8]).ljust(8, b"\x00")
+    if name not in _glyphs:
+        _names.append(name)
+    _glyphs[name] = (rows, fallback)
+
+
+def ref(name):
+    """Character that stands for glyph `name` in a frame string."""
+    return chr(REF_BASE + _names.index(name))
+
+
+def refs(text):
+    """Names of the glyphs referenced in a frame string."""
+    out = []
+    for ch in text:
+        i = ord(ch) - REF_BASE
+        if 0 <= i < len(_names):
+            out.append(_names[i])
+    return out
+
+
+register("btc", [0b01010, 0b11110, 0b01001, 0b01110, 0b01001, 0b11110, 0b01010, 0b00000], "B")
+register("up", [0b00100, 0b01110, 0b10101, 0b00100, 0b00100, 0b00100, 0b00100, 0b00000], "^")
+register("down", [0b00100, 0b00100, 0b00100, 0b00100, 0b10101, 0b01110, 0b00100, 0b00000], "v")
+register("block", [0b00000, 0b11111, 0b10001, 0b10101, 0b10001, 0b11111, 0b00000, 0b00000], "#")
+for level in range(8):
+    register(f"bar{level}", [0x00] * (7 - level) + [0x1F] * (level + 1), "_" if level < 4 else "=")
+
+
+class GlyphManager:
+    """
+    Maps glyph contents to the 8 CGRAM slots with LRU eviction.
+    A slot is only rewritten when the glyph it needs isn't already resident,
+    so redrawing the same sparkline every second costs no CGRAM writes.
+    """
+    def __init__(self, upload, slots=CGRAM_SLOTS):
+        self.upload = upload  # upload(slot, rows)
+        self.slots = slots
+        self.resident = OrderedDict()  # rows -> slot, least recently used first
+        self.pinned = set()  # rows used by the frame being drawn, never evicted
+        self.uploads = 0
+        self.hits = 0
+        self.fallbacks = 0
+
+    def begin_frame(self, *lines):
+        self.pinned = {_glyphs[name][0] for line in lines for name in refs(line)}
+
+    def slot_for(self, name):
+        rows, fallback = _glyphs[name]
+        slot = self.resident.get(rows)
+        if slot is not None:
+            self.resident.move_to_end(rows)
+            self.hits += 1
+            return chr(slot)
+        if len(self.resident) < self.slots:
+            slot = len(self.resident)
+        else:
+            victim = next((r for r in self.resident if r not in self.pinned), None)
+            if victim is None:
+                #more distinct glyphs in one frame than CGRAM holds
+                self.fallbacks += 1
+                return fallback
+            slot = self.resident.pop(victim)
+        self.upload(slot, rows)
+        self.uploads += 1
+        self.resident[rows] = slot
+        return chr(slot)
+
+    def resolve(self, text):
+        """Swap glyph refs for CGRAM slot characters, uploading glyphs that aren't resident."""
+        if not any(ord(ch) >= REF_BASE for ch in text):
+            return text
+        out = []
+        for ch in text:
+            i = ord(ch) - REF_BASE
+            out.append(self.slot_for(_names[i]) if 0 <= i < len(_names) else ch)
+        return "".join(out)
+
+    def stats(self):
+        return {"uploads": self.uploads, "hits": self.hits, "fallbacks": self.fallbacks, "resident": len(self.resident)}
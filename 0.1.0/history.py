@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+
+import math
+import operator
+import struct
+import time
+from array import array
+from functools import reduce
+
+
+class RingBuffer:
+    """
+    Fixed-size time series. Every column is a preallocated array, so memory is
+    set at construction and never grows no matter how long the device runs.
+    Samples must be appended in time order.
+    """
+    def __init__(self, capacity, columns=("value",), typecode="f"):
+        self.capacity = capacity
+        self.columns = tuple(columns)
+        self.times = array("d", bytes(8 * capacity))
+        self.data = {c: array(typecode, bytes(array(typecode).itemsize * capacity)) for c in self.columns}
+        self.head = 0  # next physical slot to write
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def nbytes(self):
+        return sum(a.itemsize * len(a) for a in (self.times, *self.data.values()))
+
+    def append(self, t, *values):
+        i = self.head
+        self.times[i] = t
+        for col, v in zip(self.columns, values):
+            self.data[col][i] = v
+        self.head = (i + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    def replace(self, t, *values):
+        """Overwrite the sample at exactly time t, False if there is none."""
+        i = self._first_since(t)
+        if i >= self.count or self.times[self._phys(i)] != t:
+            return False
+        i = self._phys(i)
+        for col, v in zip(self.columns, values):
+            self.data[col][i] = v
+        return True
+
+    def last(self, col=None):
+        if not self.count:
+            return None
+        i = (self.head - 1) % self.capacity
+        return self.data[col or self.columns[0]][i]
+
+    def last_time(self):
+        if not self.count:
+            return None
+        return self.times[(self.head - 1) % self.capacity]
+
+    def dump(self):
+        """Samples oldest first as raw arrays (native layout, it never leaves the device): count, times, each column."""
+        arrays = [self.times] + [self.data[c] for c in self.columns]
+        return struct.pack("<I", self.count) + b"".join(self._slice(a, 0).tobytes() for a in arrays)
+
+    def load(self, buf, offset=0):
+        """Replace the samples with a dump() at buf[offset:], returns the offset after it. Only the newest `capacity` are kept."""
+        (count,) = struct.unpack_from("<I", buf, offset)
+        offset += 4
+        arrays = []
+        for a in [self.times] + [self.data[c] for c in self.columns]:
+            end = offset + count * a.itemsize
+            if end > len(buf):
+                raise ValueError("ring buffer dump cut short")
+            col = array(a.typecode)
+            col.frombytes(buf[offset:end])
+            arrays.append(col[-self.capacity:])
+            offset = end
+        n = min(count, self.capacity)
+        self.times[:n] = arrays[0]
+        for c, col in zip(self.columns, arrays[1:]):
+            self.data[c][:n] = col
+        self.count = n
+        self.head = n % self.capacity
+        return offset
+
+    def _phys(self, logical):
+        return (self.head - self.count + logical) % self.capacity
+
+    def _first_since(self, since):
+        #binary search over the logical (oldest..newest) order
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.times[self._phys(mid)] < since:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _slice(self, arr, start):
+        #chronological copy of logical [start, count) as at most two C-level slices
+        if start >= self.count:
+            return arr[0:0]
+        a = self._phys(start)
+        b = self.head
+        if a < b:
+            return arr[a:b]
+        return arr[a:] + arr[:b]
+
+    def window(self, seconds=None, col=None, now=None):
+        """(times, values) arrays for the last `seconds` (everything when None)."""
+        start = 0
+        if seconds is not None:
+            start = self._first_since((now or time.time()) - seconds)
+        return self._slice(self.times, start), self._slice(self.data[col or self.columns[0]], start)
+
+    def stats(self, seconds=None, col=None, now=None):
+        """min/max/mean and least-squares slope (units per hour) over a window, or None if empty."""
+        ts, vs = self.window(seconds, col, now)
+        n = len(vs)
+        if not n:
+            return None
+        mean = math.fsum(vs) / n
+        slope = 0.0
+        if n > 1:
+            t0 = ts[0]
+            xs = array("d", (t - t0 for t in ts))
+            x_mean = math.fsum(xs) / n
+            sxy = math.fsum(map(operator.mul, xs, vs)) - n * x_mean * mean
+            sxx = math.fsum(map(operator.mul, xs, xs)) - n * x_mean * x_mean
+            if sxx > 0:
+                slope = sxy / sxx * 3600
+        return {"min": min(vs), "max": max(vs), "mean": mean, "slope": slope, "n": n}
+
+    def bins(self, seconds, count, col=None, now=None):
+        """Mean of each of `count` equal time bins across the window. Empty bins repeat the previous one."""
+        now = now or time.time()
+        ts, vs = self.window(seconds, col, now)
+        start = now - seconds
+        width = seconds / count
+        sums = [0.0] * count
+        hits = [0] * count
+        for t, v in zip(ts, vs):
+            k = min(count - 1, int((t - start) / width))
+            sums[k] += v
+            hits[k] += 1
+        out = []
+        prev = None
+        for s, h in zip(sums, hits):
+            prev = s / h if h else prev
+            out.append(prev)
+        return out
+
+
+class PriceSeries:
+    """
+    Bounded price/volume series (1024 bars, ~10 days of 15 minute bars) with a
+    time-aware EMA, rolling VWAP and percentage-change windows.
+    Bars come from exchange OHLC data (add) and from the live quotes and ticks
+    (sample): those move the EMA straight away and are averaged into a bar of
+    their own, with no volume, that OHLC data replaces when it arrives.
+    """
+    def __init__(self, capacity=1024, bar_secs=900, ema_secs=4 * 3600):
+        self.bars = RingBuffer(capacity, ("price", "volume"), "d")
+        self.bar_secs = bar_secs
+        self.ema_secs = ema_secs
+        self.ema = None
+        self.ema_at = None  # time of the newest price in the ema
+        self.live = None  # [bar start, price sum, samples] of the bar forming from live prices
+
+    def __len__(self):
+        return len(self.bars)
+
+    def add(self, t, price, volume=0.0):
+        last = self.bars.last_time()
+        if last is not None and t <= last:
+            #a bar made from live prices gives way to the exchange's own
+            return volume > 0 and self.bars.replace(t, price, volume)
+        self.bars.append(t, price, volume)
+        self._ema_update(t, price)
+        return True
+
+    def sample(self, t, price):
+        """A live price (quote or tick): updates the ema now, and the forming bar."""
+        self._ema_update(t, price)
+        start = t - t % self.bar_secs
+        if self.live and self.live[0] != start:
+            bar_start, total, n = self.live
+            self.add(bar_start, total / n)
+            self.live = None
+        if self.live is None:
+            self.live = [start, 0.0, 0]
+        self.live[1] += price
+        self.live[2] += 1
+
+    def _ema_update(self, t, price):
+        if self.ema_at is not None and t <= self.ema_at:
+            return  # older than what the ema already holds
+        if self.ema is None:
+            self.ema = price
+        else:
+            #time-aware EMA, so uneven sample spacing (bars, polls, ticks) doesn't skew it
+            alpha = 1 - math.exp(-(t - self.ema_at) / self.ema_secs)
+            self.ema += alpha * (price - self.ema)
+        self.ema_at = t
+
+    def ema_window(self, seconds=None, now=None):
+        """EMA over the bars in a window in one pass over the arrays, None if empty."""
+        ts, ps = self.bars.window(seconds, "price", now)
+        if not ps:
+            return None
+        gaps = map(operator.sub, ts[1:], ts)
+        alphas = [1 - math.exp(-dt / self.ema_secs) for dt in gaps]
+        return reduce(lambda ema, step: ema + step[0] * (step[1] - ema), zip(alphas, ps[1:]), ps[0])
+
+    def seed_ema(self):
+        """Start the ema over from the bars, e.g. after the first bulk OHLC load."""
+        self.ema = self.ema_window()
+        self.ema_at = self.bars.last_time()
+
+    def dump(self):
+        ema = (math.nan if self.ema is None else self.ema, math.nan if self.ema_at is None else self.ema_at)
+        return struct.pack("<2d", *ema) + self.bars.dump()
+
+    def load(self, buf, offset=0):
+        ema, ema_at = struct.unpack_from("<2d", buf, offset)
+        offset = self.bars.load(buf, offset + 16)
+        self.ema = None if math.isnan(ema) else ema
+        self.ema_at = None if math.isnan(ema_at) else ema_at
+        return offset
+
+    def span(self):
+        """Seconds of history held."""
+        if not self.bars:
+            return 0
+        return self.bars.last_time() - self.bars.times[self.bars._phys(0)]
+
+    def vwap(self, seconds, now=None):
+        """Volume-weighted mean price over the window, plain mean if it has no volume."""
+        _, ps = self.bars.window(seconds, "price", now)
+        if not ps:
+            return None
+        _, vs = self.bars.window(seconds, "volume", now)
+        total = math.fsum(vs)
+        if total <= 0:
+            return math.fsum(ps) / len(ps)
+        return math.fsum(map(operator.mul, ps, vs)) / total
+
+    def price_at(self, t):
+        """Price of the last sample at or before t, None if the series starts later."""
+        i = self.bars._first_since(t)
+        if i < self.bars.count and self.bars.times[self.bars._phys(i)] == t:
+            return self.bars.data["price"][self.bars._phys(i)]
+        if i == 0:
+            return None
+        return self.bars.data["price"][self.bars._phys(i - 1)]
+
+    def change(self, seconds, current=None, now=None):
+        """Percent change over the last `seconds`, None until the series covers that window."""
+        now = now or time.time()
+        current = current if current is not None else self.bars.last("price")
+        then = self.price_at(now - seconds)
+        if current is None or not then:
+            return None
+        return (current - then) / then * 100
+
+
+def levels(values, steps=8):
+    """Scale values to 0..steps-1 (None stays None) for drawing bar glyphs."""
+    present = [v for v in values if v is not None]
+    if not present:
+        return tuple(None for _ in values)
+    lo, hi = min(present), max(present)
+    span = hi - lo
+    if span == 0:
+        return tuple(None if v is None else steps // 2 for v in values)
+    return tuple(None if v is None else min(steps - 1, int((v - lo) / span * steps)) for v in values)
+
+
+def main():
+    #benchmark: python3 history.py
+    import timeit
+    buf = RingBuffer(1440, ("fastest", "half_hour", "hour"))
+    t = [time.time() - 86400]
+
+    def append():
+        t[0] += 60
+        buf.append(t[0], 12.0, 8.0, 4.0)
+
+    n = 100000
+    per = timeit.timeit(append, number=n) / n
+    print(f"append: {per * 1e6:.2f} us ({buf.nbytes()} bytes, {len(buf)} samples)")
+    now = t[0]
+    for seconds in (3600, 6 * 3600, 86400):
+        per = timeit.timeit(lambda: buf.stats(seconds, now=now), number=200) / 200
+        print(f"stats over {seconds // 3600}h: {per * 1e3:.3f} ms")
+    per = timeit.timeit(lambda: levels(buf.bins(3600, 10, now=now)), number=200) / 200
+    print(f"sparkline bins over 1h: {per * 1e3:.3f} ms")
+
+    series = PriceSeries()
+    for i in range(1024):
+        series.add(now - (1024 - i) * 900, 60000.0 + i, 5.0)
+    per = timeit.timeit(lambda: (series.vwap(86400, now), series.change(3600, now=now), series.change(7 * 86400, now=now)), number=200) / 200
+    print(f"price vwap 24h + 1h/7d change: {per * 1e3:.3f} ms")
+    per = timeit.timeit(lambda: series.ema_window(), number=200) / 200
+    print(f"price ema over {len(series)} bars: {per * 1e3:.3f} ms")
+    per = timeit.timeit(lambda: series.sample(now, 61000.0), number=n) / n
+    print(f"live price sample: {per * 1e6:.2f} us")
+
+
+if __name__ == "__main__":
+    main()
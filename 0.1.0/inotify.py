@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+
+import os
+import struct
+import time
+from pathlib import Path
+
+IN_CLOSE_WRITE = 0x08
+IN_MOVED_TO = 0x80
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+EVENT = struct.Struct("iIII")  # wd, mask, cookie, name length, then the name
+
+
+class FileWatch:
+    """
+    Tells when a file was rewritten, through inotify. The watch is on the
+    file's directory: editors and write_config may replace the file, and a
+    watch on the file itself would go with the old one.
+    fileno() is for an event loop's add_reader, changed() reads the pending
+    events and says whether any were about our file. Costs nothing while the
+    file is left alone. ctypes is only loaded here, not at startup.
+    """
+    def __init__(self, path):
+        import ctypes
+        self.path = Path(path).resolve()
+        libc = ctypes.CDLL(None, use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        wd = libc.inotify_add_watch(self.fd, str(self.path.parent).encode(), IN_CLOSE_WRITE | IN_MOVED_TO)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"inotify_add_watch {self.path.parent} failed")
+        self.name = self.path.name.encode()
+        self.changes = 0
+
+    def fileno(self):
+        return self.fd
+
+    def changed(self):
+        hit = False
+        while True:
+            try:
+                buf = os.read(self.fd, 4096)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(buf):
+                _, _, _, length = EVENT.unpack_from(buf, offset)
+                offset += EVENT.size
+                name = buf[offset:offset + length].rstrip(b"\0")
+                offset += length
+                if name == self.name:
+                    hit = True
+        if hit:
+            self.changes += 1
+        return hit
+
+    def close(self):
+        os.close(self.fd)
+
+
+def main():
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "config.json"
+        path.write_text("{}")
+        watch = FileWatch(path)
+        assert not watch.changed()
+        (Path(tmp) / "other.json").write_text("{}")
+        assert not watch.changed()
+        #rewritten in place, then replaced the way write_config and editors do it
+        path.write_text('{"a": 1}')
+        assert watch.changed()
+        tmp_file = path.with_suffix(".tmp")
+        tmp_file.write_text('{"a": 2}')
+        os.replace(tmp_file, path)
+        time.sleep(0.01)
+        assert watch.changed()
+        watch.close()
+        print(f"ok, {watch.changes} changes seen")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+
+import string
+import time
+
+_formatter = string.Formatter()
+
+
+class Segment:
+    """One piece of a line: literals and {field:spec} slots, parsed once."""
+    def __init__(self, template):
+        self.parts = []  # (literal, field or None, spec)
+        self.fixed = 0  # width of the literals
+        for literal, field, spec, _ in _formatter.parse(template):
+            self.parts.append((literal, field, spec or ""))
+            self.fixed += len(literal)
+
+    def slots(self):
+        return [(field, spec) for _, field, spec in self.parts if field is not None]
+
+    def width(self, widths):
+        return self.fixed + sum(widths[(field, spec)] for _, field, spec in self.parts if field is not None)
+
+    def render(self, texts):
+        return "".join(literal + (texts[(field, spec)] if field is not None else "") for literal, field, spec in self.parts)
+
+
+class Line:
+    """
+    One display line as candidate templates, most detailed first. The longest
+    candidate that fits wins, like picking from justify2/justify3 strings:
+    one segment is left aligned (or centered), two go to the edges, three are
+    spread with even gaps.
+    Fields are only re-formatted when their value changes, the candidate choice
+    is memoized by the widths of the field texts, and an unchanged line is
+    returned as is.
+    """
+    def __init__(self, *candidates, cols=16, center=False):
+        self.cols = cols
+        self.center = center
+        self.candidates = [tuple(Segment(t) for t in ((c,) if isinstance(c, str) else c)) for c in candidates]
+        self.slots = sorted({slot for cand in self.candidates for seg in cand for slot in seg.slots()})
+        self.fields = tuple(sorted({field for field, _ in self.slots}))
+        self._raw = None  # field values the last line was rendered from
+        self._texts = {}  # slot -> ((type, value), text)
+        self._fit = {}  # widths of the slot texts -> candidate index
+        self._last = None  # (slot texts, line)
+        self.renders = 0
+        self.reused = 0
+
+    def _text(self, slot, value):
+        key = (type(value), value)
+        cached = self._texts.get(slot)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        text = format(value, slot[1])
+        self._texts[slot] = (key, text)
+        return text
+
+    def _width(self, cand, widths):
+        total = sum(seg.width(widths) for seg in cand)
+        #justify2 needs a space between the two, justify3 two, or they run together
+        gaps = len(cand) - 1
+        return self.cols if gaps and total <= self.cols - gaps else total
+
+    def _choose(self, widths):
+        sizes = [self._width(cand, widths) for cand in self.candidates]
+        fitting = [i for i, size in enumerate(sizes) if size <= self.cols]
+        if not fitting:
+            return len(self.candidates) - 1
+        return max(fitting, key=lambda i: sizes[i])
+
+    def _join(self, cand, texts):
+        parts = [seg.render(texts) for seg in cand]
+        if len(parts) == 1:
+            text = parts[0]
+            if self.center and len(text) < self.cols:
+                padding = self.cols - len(text)
+                left = (padding + 1) // 2
+                text = " " * left + text + " " * (padding - left)
+            return text
+        spaces = self.cols - sum(len(p) for p in parts)
+        if spaces < len(parts) - 1:
+            return "".join(parts)
+        if len(parts) == 2:
+            return f"{parts[0]}{' ' * spaces}{parts[1]}"
+        gap1 = spaces // 2
+        return f"{parts[0]}{' ' * gap1}{parts[1]}{' ' * (spaces - gap1)}{parts[2]}"
+
+    def render(self, **values):
+        raw = tuple(values[f] for f in self.fields)
+        raw = (raw, tuple(map(type, raw)))
+        if raw == self._raw:
+            self.reused += 1
+            return self._last[1]
+        self._raw = raw
+        texts = {slot: self._text(slot, values[slot[0]]) for slot in self.slots}
+        key = tuple(texts[slot] for slot in self.slots)
+        if self._last is not None and self._last[0] == key:
+            self.reused += 1
+            return self._last[1]
+        widths = tuple(len(t) for t in key)
+        index = self._fit.get(widths)
+        if index is None:
+            index = self._fit[widths] = self._choose(dict(zip(self.slots, widths)))
+        line = self._join(self.candidates[index], texts)
+        self._last = (key, line)
+        self.renders += 1
+        return line
+
+
+def main():
+    #per-tick cost of screen 2's fee line: the five justify candidates vs the compiled Line
+    import random
+
+    cols = 16
+
+    def justify2(left, right):
+        space_count = cols - len(left) - len(right)
+        return f"{left}{right}" if space_count < 1 else f"{left}{' ' * space_count}{right}"
+
+    def justify3(w1, w2, w3):
+        total_spaces = cols - len(w1) - len(w2) - len(w3)
+        if total_spaces < 2:
+            return f"{w1}{w2}{w3}"
+        gap1 = total_spaces // 2
+        return f"{w1}{' ' * gap1}{w2}{' ' * (total_spaces - gap1)}{w3}"
+
+    def rebuild(fastest, half_hour, hour):
+        options = [
+            justify2("sat/vB", f"H{fastest} M{half_hour} L{hour}"),
+            justify2("sat/vB", f"{fastest} {half_hour} {hour}"),
+            justify2("s/vB", f"{fastest} {half_hour} {hour}"),
+            justify3(f"H{fastest}", f"M{half_hour}", f"L{hour}"),
+            justify3(str(fastest), str(half_hour), str(hour)),
+        ]
+        return max((s for s in options if len(s) <= 16), key=len, default=options[4])
+
+    fees = Line(
+        ("sat/vB", "H{fastest} M{half_hour} L{hour}"),
+        ("sat/vB", "{fastest} {half_hour} {hour}"),
+        ("s/vB", "{fastest} {half_hour} {hour}"),
+        ("H{fastest}", "M{half_hour}", "L{hour}"),
+        ("{fastest}", "{half_hour}", "{hour}"),
+    )
+
+    #fees change about every 10 ticks, like a 10s poll under a 1s render loop
+    random.seed(1)
+    ticks = []
+    values = (12, 8, 3)
+    for i in range(100000):
+        if i % 10 == 0:
+            values = tuple(random.choice([1, 3, 12, 45, 150, 1200, 25000]) for _ in range(3))
+        ticks.append(values)
+
+    for values in ticks[:5000]:
+        assert fees.render(fastest=values[0], half_hour=values[1], hour=values[2]) == rebuild(*values), values
+
+    start = time.perf_counter()
+    for values in ticks:
+        rebuild(*values)
+    old = (time.perf_counter() - start) / len(ticks)
+    start = time.perf_counter()
+    for fastest, half_hour, hour in ticks:
+        fees.render(fastest=fastest, half_hour=half_hour, hour=hour)
+    new = (time.perf_counter() - start) / len(ticks)
+    print(f"rebuild candidates: {old * 1e6:.2f} us/tick, compiled line: {new * 1e6:.2f} us/tick ({old / new:.1f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,6 @@
 #!/usr/bin/env python3
 
 import sys
-import termios
-import tty
 import select
 import time
 from pathlib import Path
@@ -12,36 +10,172 @@ PARENT_DIR = Path(__file__).resolve().parent.parent
 sys.path.insert(0, str(PARENT_DIR))
 # Now Python will look in mainfolder/ for imports
 import LCD1602
+import glyphs
+import timeline
+import display
 
 class LCD:
-    def __init__(self, cols=16, rows=2):
+    def __init__(self, cols=16, rows=2, backend=None):
         self.cols = cols
         self.rows = rows
-        self.lcd = LCD1602.LCD1602(cols, rows)
+        #"i2c", "emulator" or "terminal", see display.py
+        self.bus = display.open_bus(backend, cols, rows)
+        self.lcd = LCD1602.LCD1602(cols, rows, bus=self.bus)
         self.line0 = ""
         self.line1 = ""
+        #shadow of what the display shows, so only changed cells go over I2C
+        self.shadow = [[" "] * cols for _ in range(rows)]
+        #and of the full 40-char DDRAM lines the display shows a window of, `offset` cells in
+        self.ddram = [[" "] * LCD1602.DDRAM_COLS for _ in range(rows)]
+        self.offset = 0
+        self.cursor = None  # (address, row) of the controller's address counter, None if unknown
+        self.frame_bytes = 0  # data bytes written in the last frame
+        self.frame_commands = 0  # commands (cursor moves, shifts) in the last frame
+        self.total_bytes = 0
+        self.total_commands = 0
+        self.glyphs = glyphs.GlyphManager(self.create_char)
 
     def clear(self):
+        #clear also undoes any display shift
         self.lcd.clear()
+        self.shadow = [[" "] * self.cols for _ in range(self.rows)]
+        self.ddram = [[" "] * LCD1602.DDRAM_COLS for _ in range(self.rows)]
+        self.offset = 0
+        self.cursor = (0, 0)
+
+    def _command(self, count=1):
+        self.frame_commands += count
+        self.total_commands += count
+
+    def _move(self, addr, row):
+        if self.cursor != (addr, row):
+            self.lcd.setCursor(addr, row)
+            self._command()
+        self.cursor = (addr, row)
+
+    def _write_ddram(self, addr, row, text):
+        #the address counter runs on into the next line past 39, so split at the end
+        while text:
+            part = text[:LCD1602.DDRAM_COLS - addr]
+            self._move(addr, row)
+            self.lcd.printout(part)
+            self.ddram[row][addr:addr + len(part)] = list(part)
+            self.frame_bytes += len(part)
+            self.total_bytes += len(part)
+            end = addr + len(part)
+            self.cursor = (end, row) if end < LCD1602.DDRAM_COLS else None
+            text = text[len(part):]
+            addr = 0
+
+    def _write(self, col, row, text):
+        self._write_ddram((col + self.offset) % LCD1602.DDRAM_COLS, row, text)
+        self.shadow[row][col:col + len(text)] = list(text)
+
+    def _refresh_view(self):
+        width = LCD1602.DDRAM_COLS
+        self.shadow = [[line[(col + self.offset) % width] for col in range(self.cols)] for line in self.ddram]
 
     def _print_line(self, line_num, text, clear=True):
-        self.lcd.setCursor(0, line_num)
-        if clear:
-            self.lcd.printout(" " * self.cols)
-            self.lcd.setCursor(0, line_num)
-        self.lcd.printout(text[:self.cols])
+        text = self.glyphs.resolve(text[:self.cols])
+        current = self.shadow[line_num]
+        target = list(text.ljust(self.cols)) if clear else list(text) + current[len(text):]
+
+        #dirty runs, merging runs separated by clean cells when rewriting them is
+        #cheaper than the cursor move that skips them: one cell per byte, a few in bulk
+        gap = 4 if getattr(self.lcd, "bulk", False) else 1
+        runs = []
+        for col in range(self.cols):
+            if target[col] == current[col]:
+                continue
+            if runs and col - runs[-1][1] <= gap:
+                runs[-1][1] = col + 1
+            else:
+                runs.append([col, col + 1])
+        for start, end in runs:
+            self._write(start, line_num, "".join(target[start:end]))
+
+    def _begin_frame(self, *lines):
+        #glyphs in this frame keep their CGRAM slots while the frame is drawn
+        self.glyphs.begin_frame(*lines)
+        self.frame_bytes = 0
+        self.frame_commands = 0
+
+    def frame_stats(self):
+        return {"bytes": self.frame_bytes, "commands": self.frame_commands}
 
     def output(self, sleep_time=0, line0="", line1="", clear_line0=True, clear_line1=True):
+        self._begin_frame(line0, line1)
         self._print_line(0, line0, clear_line0)
         self._print_line(1, line1, clear_line1)
         time.sleep(int(sleep_time))
 
     def center(self, sleep_time=0, line0="", line1="", clear_line0=True, clear_line1=True):
+        self._begin_frame(line0, line1)
         self._print_line(0, self._center_16(line0), clear_line0)
         self._print_line(1, self._center_16(line1), clear_line1)
         time.sleep(int(sleep_time))
         #self.output(sleep_time, self._center_16(line0), self._center_16(line1))
 
+    def create_char(self, slot, rows):
+        self.lcd.createChar(slot, rows)
+        #CGRAM writes move the address counter off DDRAM, the next write must set it again
+        self.cursor = None
+
+    def shift_to(self, offset):
+        """Move the display window to `offset` DDRAM cells in, one shift command per cell, the short way round."""
+        width = LCD1602.DDRAM_COLS
+        steps = (offset - self.offset) % width
+        if steps > width // 2:
+            steps -= width
+        for _ in range(abs(steps)):
+            if steps > 0:
+                self.lcd.scrollDisplayLeft()
+            else:
+                self.lcd.scrollDisplayRight()
+        self._command(abs(steps))
+        self.offset = offset % width
+        self._refresh_view()
+
+    def _fill_ddram(self, row, target):
+        runs = []
+        for addr, ch in enumerate(target):
+            if ch == self.ddram[row][addr]:
+                continue
+            if runs and addr - runs[-1][1] <= 4:
+                runs[-1][1] = addr + 1
+            else:
+                runs.append([addr, addr + 1])
+        for start, end in runs:
+            self._write_ddram(start, row, "".join(target[start:end]))
+
+    def scroll_window(self, line_num, text, pos):
+        """
+        Show text[pos:pos + cols] on a line.
+        A display shift moves every line, so while the other lines are blank (one repeated
+        character) text up to 40 chars is written into DDRAM once and each step is a single
+        shift command. Otherwise the visible window is rewritten.
+        """
+        width = LCD1602.DDRAM_COLS
+        text = self.glyphs.resolve(text)
+        others = [r for r in range(self.rows) if r != line_num]
+        if len(text) <= width and all(len(set(self.shadow[r])) == 1 for r in others):
+            target = list(text.ljust(width))
+            if self.ddram[line_num] != target:
+                self._fill_ddram(line_num, target)
+            for r in others:
+                self._fill_ddram(r, [self.shadow[r][0]] * width)
+            self.shift_to(pos)
+            return
+        self._print_line(line_num, text[pos:pos + self.cols], clear=False)
+
+    def glyph(self, name):
+        """Character for a named CGRAM glyph (see glyphs.py), given a slot when drawn."""
+        return glyphs.ref(name)
+
+    def sparkline(self, levels):
+        """Levels (0-7 or None) to a string of bar glyphs."""
+        return "".join(" " if lvl is None else glyphs.ref(f"bar{lvl}") for lvl in levels)
+
     def justify2(self, left, right):
         return self._justify2_16(left, right)
 
@@ -64,6 +198,9 @@ class LCD:
             s = buf[-self.cols:]  # output last 16 chars
             return s.ljust(self.cols)
 
+        #only the setup prompts read raw keys, so termios/tty load here
+        import termios
+        import tty
         fd = sys.stdin.fileno()
         old_settings = termios.tcgetattr(fd)
         buf = initial_text or ""
@@ -119,6 +256,9 @@ class LCD:
             key, value = options[index]
             lcd.center(0, key, value)
 
+        #only the setup prompts read raw keys, so termios/tty load here
+        import termios
+        import tty
         fd = sys.stdin.fileno()
         old_settings = termios.tcgetattr(fd)
 
@@ -186,27 +326,28 @@ class LCD:
     def scroll_text(self, delay_after_scroll=2, text="(null str)", line_num=1, delay=0.2):
         """
         Scrolls text horizontally on the specified LCD line, and adds an additional delay
-        after the scrolling is done.
+        after the scrolling is done. The other line is blanked while the text moves and
+        put back for the holds at either end. Blocks until done, for the interactive setup;
+        anything that must keep running meanwhile should add a Scroll to a Timeline instead.
         
         :param delay_after_scroll: The delay in seconds after the scrolling is finished.
         :param text: The text to display, which will scroll if it exceeds the screen width.
         :param line_num: The line (0 or 1) to display the text.
         :param delay: The delay in seconds between each scroll movement.
         """
-        # If text length is greater than the display width, scroll it.
-        if len(text) > self.cols:
-            time.sleep(1) #pause so first char won't blow by
-            # Repeat the scrolling by moving the starting position across the text
-            for i in range(len(text) - self.cols + 1):
-                # Display a substring of 'cols' characters starting from index i
-                self._print_line(line_num, text[i:i + self.cols], clear=False)
-                time.sleep(delay)
-        else:
-            # If text fits within the LCD width, display it normally
-            self._print_line(line_num, text, clear=True)
-        
-        # After scrolling, wait for the specified delay (in seconds)
-        time.sleep(delay_after_scroll)
+        tl = timeline.Timeline(self)
+        #keep the other line as it is on screen
+        other = 1 - line_num
+        label = "".join(self.shadow[other])
+        tl.text[other] = label
+        moves = len(text) - self.cols
+        if moves > 0 and len(self.glyphs.resolve(text)) <= LCD1602.DDRAM_COLS and label.strip():
+            #the label steps aside while the text moves, so each step is one display shift
+            tl.show(other, label, duration=1)
+            tl.show(other, "", duration=moves * delay)
+            tl.show(other, label)
+        tl.scroll(line_num, text, step=delay, hold_start=1, hold_end=delay_after_scroll)
+        tl.wait()
 
 
 
@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 
 import os
+import signal
+import threading
 import time
 import json
 from lcd import LCD
@@ -11,6 +13,17 @@ import block
 import fees
 import price
 import commands
+import transport
+import fetcher
+import stream
+import compositor
+import timeline
+import eventloop
+import screens
+import boot
+import cache
+import watchdog
+import inotify
 from pathlib import Path
 
 SCRIPT_ROOT = Path(__file__).resolve().parent
@@ -20,98 +33,260 @@ CONFIG_FILE = SCRIPT_ROOT.parent / "config.json"
 def main():
 
     #objects
-    block_now = block.BlockMetadata()
-    fees_now = fees.FeeStats()
-    price_now = price.PriceFetcher()
-    lcd = LCD()
     config = commands.load_config(CONFIG_FILE)
+    lcd = LCD(backend=config.display)
     
-    #boot splash and header
-    lcd.center(2, "stay humble", "stack sats")
+    #a state saved by the last run (tmpfs, so only across service restarts, not reboots)
+    #means this is a restart: show that data straight away instead of a full boot
+    state_file = cache.StateFile()
+    saved = state_file.load() if config.warm_start else None
+    warm = saved is not None and time.time() - saved[0] < config.warm_start
+
+    #systemctl stop/restart sends SIGTERM: someone is at the box, so the next
+    #start is cold and offers the setup window. Crashes and watchdog exits
+    #(unattended, Restart=on-failure) never get here and keep the saved state
+    def stopped(signum, frame):
+        #once: systemd (or timeout) may signal again while the threads wind down
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        state_file.remove()
+        raise SystemExit(0)
+    signal.signal(signal.SIGTERM, stopped)
     lcd.splash0 = "BTC  MON"
     lcd.line1 = ""
-    lcd.center(0, lcd.splash0, lcd.line1)
-    
-    #switch to non-interactive tty to shield tty0 from input, and listen for keypress
-    ui.check_interactive(lcd, config, SCRIPT_ROOT)
-
-    lcd.center(0, lcd.splash0, "getting ip")
-    if not commands.get_ip_address():
-        if not commands.try_all_networks():        
-            lcd.center(2, lcd.splash0, "no ip, plz setup")
-            raise RuntimeError("no ip, plz setup, exiting")
-    
-    success, count = commands.ping_host()
-    if not success:
-        lcd.center(2, lcd.splash0, "ping! offline?")
-        raise RuntimeError("ping! offline?")
-    
-    lcd.center(0, lcd.splash0, "getting ntp")
-    success, status = commands.systemd_timesyncd_ready()
-    if not success:
-        lcd.center(0, lcd.splash0, status)
-        raise RuntimeError("ntp failed after timeout")
-
-    lcd.center(0, lcd.splash0, "getting block")
-    block_now.update()
-        #check for error count in block_now.request_error_count
-    lcd.center(0, lcd.splash0, "getting fees")
-    fees_now.update()
-    lcd.center(0, lcd.splash0, "getting price")
-    price_now.update()
 
-    
-    #set vars for infinite loop
-    epoch_now = int(time.time())
-    epoch_flip = int(time.time())
-    last_meta_epoch = epoch_now
-    last_price_epoch = epoch_now
-    use_Screen = 0
-    apiWasCalled = 0
-    while True:
-        epoch_now = int(time.time())
-        
-        #mempool.space refresh
-        if epoch_now - last_meta_epoch >= config.wait_meta:
-            block_now.update()
-            fees_now.update()
-            last_meta_epoch = epoch_now
-            apiWasCalled = 1
-            if block_now.new_block:
-                lcd.output(2, "+--NEW  BLOCK--+", "|______________|")
-                block_now.new_block = False
-        
-        #kraken price refresh
-        if epoch_now - last_price_epoch >= config.wait_price:
-            price_now.update()
-            last_price_epoch = epoch_now
-            apiWasCalled = 1
-        
-        #cycle screens (structure makes it easier to add more screens to rotation)
-        if epoch_now >= epoch_flip:
-            use_Screen = (use_Screen + 1) %2 #where %n is the number of screens
-            epoch_flip = int(time.time()) + config.wait_scr_chg 
+    #boot steps run as soon as what they need is done: loading the sources overlaps
+    #the setup-key window, the network checks and first fetches overlap each other
+    steps = boot.Boot()
+
+    def load_sources():
+        #cached values load here, so screens have something to show straight away
+        block_now = block.BlockMetadata()
+        fees_now = fees.FeeStats(spark_window=config.fee_window)
+        price_now = price.PriceFetcher(sources=config.price_sources, quorum=config.price_quorum)
+        if warm:
+            for name, source in (("block", block_now), ("fees", fees_now), ("price", price_now)):
+                if name in saved[1]:
+                    source.warm_start(*saved[1][name])
+        #not polling yet, but its snapshot already holds what was loaded
+        return fetcher.FetchEngine(config, block_now, fees_now, price_now)
+
+    def network():
+        if not commands.get_ip_address():
+            if not commands.try_all_networks():
+                raise RuntimeError("no ip, plz setup")
+
+    def ping():
+        success, count = commands.ping_host()
+        if not success:
+            raise RuntimeError("ping! offline?")
+
+    def ntp():
+        success, status = commands.systemd_timesyncd_ready()
+        if not success:
+            raise RuntimeError(status)
+        #https fetches that failed on a wrong clock can go again right away
+        engine = steps.result("engine")
+        if engine:
+            engine.refresh_now()
+
+    def start_engine(engine):
+        #all sources fetch concurrently in the background from here on
+        engine.start()
         
-        match use_Screen:
-            case 0:
-                ui.screen_1_handler(lcd, config, price_now)         
-            case 1:
-                ui.screen_2_handler(lcd, block_now, fees_now)
-            case _:
-                lcd.center(0, "screen case err", "exiting")
-                raise RuntimeError("screen case err")
+        #optional push feeds, polling stays as the fallback
+        if config.stream_mempool:
+            mempool_ws = stream.MempoolStream(
+                on_block=lambda meta: engine.push("block", lambda b: b.apply_block(meta)),
+                on_blocks=lambda blocks: engine.push("block", lambda b: b.apply_blocks(blocks)),
+                on_fees=lambda data: engine.push("fees", lambda f: f.apply(data)),
+            )
+            mempool_ws.on_state = lambda up: engine.set_streaming(up, "block", "fees")
+            mempool_ws.start()
+        if config.stream_price:
+            #ticks can arrive several times a second, only publish every price_refresh seconds
+            engine.throttle("price", config.price_refresh)
+            kraken_ws = stream.KrakenStream(
+                on_tick=lambda vwap, ask, bid: engine.push("price", lambda p: p.apply_tick(vwap, ask, bid)),
+            )
+            kraken_ws.on_state = lambda up: engine.set_streaming(up, "price")
+            kraken_ws.start()
+        return engine
+
+    loop = eventloop.EventLoop()
+
+    def boot_failed(e):
+        #a step still running behind the screens failed, boot cold next time
+        #so the setup window is offered
+        state_file.remove()
+        engine.stop()
+        screen.stop()
+        lcd.center(2, lcd.splash0, str(e))
+        raise RuntimeError(e)
+
+    if warm:
+        #no splash or setup window, the network steps run behind the screens
+        print(f"warm start from state saved {time.time() - saved[0]:.0f}s ago")
+        engine = load_sources()
+        ui.release_console()
+        steps.add("network", network, label="getting ip")
+        steps.add("engine", lambda: start_engine(engine), needs=["network"], label="getting data")
+    else:
+        #boot splash and header, animations play while the boot steps run instead of sleeping
+        tl = timeline.Timeline(lcd)
+        tl.splash("stay humble", "stack sats", 2)
+
+        #switch to non-interactive tty to shield tty0 from input, and listen for keypress.
+        #the network steps wait for it: setup may be joining a wifi network
+        steps.add("interactive", lambda: ui.check_interactive(lcd, config, SCRIPT_ROOT, tl), main=True)
+        steps.add("sources", load_sources)
+        steps.add("network", network, needs=["interactive"], label="getting ip")
+        steps.add("engine", lambda: start_engine(steps.result("sources")), needs=["sources", "network"], label="getting data")
+    steps.add("ping", ping, needs=["network"], label="ping")
+    steps.add("ntp", ntp, needs=["network"], label="getting ntp")
+
+    if not warm:
+        status = {"text": None}
+        def show_status():
+            running = steps.running()
+            if any(stage.main for stage in running):
+                return  # the setup prompt has the screen
+            labels = [stage.label for stage in running]
+            text = labels[0] if labels else ""
+            if text != status["text"]:
+                status["text"] = text
+                tl.splash(lcd.splash0, text)
+
+        #the screens start once there is data and the clock is right, ping finishes behind them
+        try:
+            steps.run(tick=tl.tick, on_change=show_status, until=["engine", "ntp"])
+        except RuntimeError as e:
+            tl.splash(lcd.splash0, str(e), 2)
+            tl.wait()
+            raise
+        tl.wait()
+        engine = steps.result("engine")
+    steps.start(on_error=lambda e: loop.call_soon_threadsafe(boot_failed, e))
+    block_now = engine.sources["block"].obj
+    price_now = engine.sources["price"].obj
+
+    #from here on only the compositor's writer thread touches the lcd
+    screen = compositor.Compositor(lcd).start()
+    
+    #everything from here runs on one event loop: it wakes for timers (screen flip,
+    #report, the clock's next minute), new snapshots from the fetch threads, and key presses
+    #screens and how long each stays up come from config.screens/screen_dwell
+    rotation = screens.rotation(config)
+    print("screens: " + ", ".join(f"{shown.name} {dwell}s" for shown, dwell in rotation))
+    state = {"screen": -1, "blocks_seen": 0, "changes": None, "pending": False}
+    pending = threading.Lock()  # state["pending"] is set from fetch/stream threads
+
+    def render():
+        with pending:
+            state["pending"] = False
+        snap = engine.snapshot()
         
-        #if api was called, sum failure counts on objects
-        if apiWasCalled:
-            #print (f"{block_now.request_error_count}, {fees_now.request_error_count}, {price_now.request_error_count}")
-            failures = sum([block_now.request_error_count, fees_now.request_error_count, price_now.request_error_count])
-            if ( failures >= config.api_failures):
-                lcd.center(2, f"API failures: {failures}", "exiting")
-                raise RuntimeError(f"too many API failures: {failures}")
-        apiWasCalled = 0
+        if snap.blocks_seen != state["blocks_seen"]:
+            state["blocks_seen"] = snap.blocks_seen
+            if config.block_splash:
+                screen.overlay("+--NEW  BLOCK--+", "|______________|", 2, key="block")
         
-        #this balances screen refresh with updating data within the wait_scr_chg.
-        time.sleep(1)
+        #draw returns the wall time the content next changes on its own, None if only new data changes it
+        shown, _ = rotation[state["screen"]]
+        changes_at = shown.draw(screen, config, snap)
+        if state["changes"]:
+            state["changes"].cancel()
+        state["changes"] = loop.call_at_wall(changes_at, render) if changes_at is not None else None
+        #failing apis don't end the process: each source's breaker stops polling it
+        #for a while and its screens show the last data, marked stale
+
+    def published():
+        #from a fetch/stream thread, several publishes before the loop runs need one render
+        with pending:
+            if state["pending"]:
+                return
+            state["pending"] = True
+        loop.call_soon_threadsafe(render)
+
+    #cycle screens, only fetching what this screen and the next one show
+    def flip():
+        state["screen"] = (state["screen"] + 1) % len(rotation)
+        render()
+        shown, dwell = rotation[state["screen"]]
+        upcoming, _ = rotation[(state["screen"] + 1) % len(rotation)]
+        wanted = screens.needs(config, shown, upcoming)
+        if config.block_splash:
+            #the new block splash shows on any screen
+            wanted.setdefault("block", config.wait_meta)
+        engine.want(wanted)
+        state["flip"] = loop.call_later(dwell, flip)
+
+    #a key press skips to the next screen
+    def key(device):
+        if ui.key_pressed(device):
+            state["flip"].cancel()
+            flip()
+
+    #config.json edits (by hand or over ssh) show up without a restart: inotify
+    #wakes the loop only when the file is written, nothing is polled
+    def config_changed(watch):
+        if not watch.changed():
+            return
+        try:
+            new = commands.load_config(CONFIG_FILE)
+            picked = screens.rotation(new)
+        except Exception as e:
+            print(f"config.json not reloaded: {e}")
+            return
+        vars(config).update(vars(new))
+        rotation[:] = picked
+        print("config reloaded, screens: " + ", ".join(f"{shown.name} {dwell}s" for shown, dwell in rotation))
+        print("fetch, stream and display settings apply on the next restart")
+        state["flip"].cancel()
+        state["screen"] = -1
+        flip()
+
+    #log connection reuse/latency and polls saved so both can be verified in journalctl
+    def report():
+        for line in transport.shared().report() + engine.scheduler.report() + engine.report() + block_now.report() + price_now.report() + loop.report():
+            print(line)
+        print(f"compositor: {screen.stats()}")
+        print(f"glyphs: {lcd.glyphs.stats()}")
+        loop.call_later(600, report)
+
+    #what the restarted process shows while it fetches
+    def save_state():
+        try:
+            state_file.save(engine.save_state())
+        except OSError as e:
+            print(f"Error writing {state_file.path}: {e}")
+
+    def save_periodically():
+        save_state()
+        loop.call_later(60, save_periodically)
+
+    #the process only exits when something is stuck for real: a loop callback,
+    #an LCD write or a fetch hanging past every timeout
+    dog = watchdog.Watchdog(timeout=120, on_stall=save_state)
+    dog.watch("event loop", lambda: loop.busy_since)
+    dog.watch("lcd writer", lambda: screen.busy_since)
+    dog.watch("fetch", engine.busy_since)
+
+    engine.on_publish = published
+    loop.on_clock_jump.append(render)
+    for device in ui.keyboards():
+        loop.add_reader(device, key, device)
+    try:
+        config_watch = inotify.FileWatch(CONFIG_FILE)
+        loop.add_reader(config_watch, config_changed, config_watch)
+    except OSError as e:
+        print(f"not watching {CONFIG_FILE} for changes: {e}")
+    flip()
+    steps.mark("first frame")
+    print(steps.report()[-1])
+    loop.call_later(600, report)
+    loop.call_later(60, save_periodically)
+    dog.start()
+    loop.run()
    
     lcd.clear()
     lcd.close()
@@ -1,48 +1,177 @@
 #!/usr/bin/env python3
 
-import requests
-import json
-import os
-from pathlib import Path
+import math
+import struct
+import time
+import transport
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError
+from cache import RecordCache, CachedSource
+from exchanges import Exchange, Quote, median, parse_sources
+from history import PriceSeries
 
-CACHE_FILE = Path("/run/btcmon/kraken_price_cache.json")
-CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
-CACHE_FILE.touch(exist_ok=True)
+OHLC_URL = "https://api.kraken.com/0/public/OHLC?pair=XBTUSD&interval=15"
+BAR_SECS = 900
+STATE = struct.Struct("<4dq")  # price, vwap, bid, ask, ohlc_since (-1 for none), then the bar series
 
-class PriceFetcher:
-    def __init__(self):
+class PriceFetcher(CachedSource):
+    """
+    Price aggregated across exchanges. Every update asks all healthy exchanges
+    at once and returns as soon as `quorum` of them answer (the rest finish in
+    the background and only count toward health). Shown price is the median.
+    """
+    state_version = 4  # the bar series carries its ema
+    def __init__(self, http=None, sources="kraken", quorum=1):
+        self.http = http or transport.shared()
+        self.exchanges = parse_sources(sources) or [Exchange("kraken")]
+        self.quorum = max(1, min(quorum, len(self.exchanges)))
+        self.pool = ThreadPoolExecutor(max_workers=len(self.exchanges), thread_name_prefix="quote")
+        self.quotes = []
+        self.cache = RecordCache("price", ("price", "vwap", "bid", "ask"), "dddd")
+        self.vwap = None
+        self.bid = None
+        self.ask = None
         self.price = 0.0
         self.trend = "-"
         self.last_price = None
         self.request_error_count = 1
+        self.series = PriceSeries()  # 15 minute bars, seeded by one bulk OHLC call
+        self.ohlc_since = None
+        self.ohlc_last = None  # start of the newest OHLC bar seen by this process
+        self.mid = None
+        self.change_1h = None
+        self.change_24h = None
+        self.change_7d = None
+        self.load_cache()
 
-    def update(self):
-        url = "https://api.kraken.com/0/public/Ticker?pair=XBTUSD"
+    def cache_values(self):
+        #exchanges without a vwap leave it None, which doesn't pack
+        return {k: math.nan if v is None else v for k, v in (("price", self.price), ("vwap", self.vwap), ("bid", self.bid), ("ask", self.ask))}
+
+    def restore(self, record):
+        vwap = None if math.isnan(record["vwap"]) else record["vwap"]
+        self.set_price(record["price"], vwap, record["ask"], record["bid"])
+
+    def dump_state(self):
+        values = [math.nan if v is None else v for v in (self.price, self.vwap, self.bid, self.ask)]
+        since = -1 if self.ohlc_since is None else int(self.ohlc_since)
+        return STATE.pack(*values, since) + self.series.dump()
+
+    def load_state(self, buf):
+        price, vwap, bid, ask, since = STATE.unpack_from(buf, 0)
+        self.series.load(buf, STATE.size)
+        self.ohlc_since = None if since < 0 else since
+        if not math.isnan(bid):
+            #trend and changes are worked out again against the restored bars
+            self.set_price(price, None if math.isnan(vwap) else vwap, ask, bid)
+
+    def set_price(self, price, vwap, ask, bid):
+        """
+        Shown price is the current mid price. The trend arrow compares it to
+        the series' ema, or to the vwap until the series has one.
+        """
+        self.vwap, self.ask, self.bid = vwap, ask, bid
+        self.mid = price
+        basis = self.series.ema
+        if basis is None:
+            basis = vwap
+            if self.series.span() >= 23 * 3600:
+                basis = self.series.vwap(86400) or basis
+        if basis is not None and price != basis:
+            self.trend = "^" if price > basis else "v"
+        self.last_price = self.price
+        self.price = price
+        self.refresh_changes()
+
+    def refresh_changes(self):
+        self.change_1h = self.series.change(3600, self.mid)
+        self.change_24h = self.series.change(86400, self.mid)
+        self.change_7d = self.series.change(7 * 86400, self.mid)
+
+    def update_bars(self):
+        """
+        The first call seeds ~7.5 days of 15 minute bars in one request,
+        later calls only ask for bars since the last one seen.
+        """
+        url = OHLC_URL if self.ohlc_since is None else f"{OHLC_URL}&since={self.ohlc_since}"
+        resp = self.http.get(url)
+        resp.raise_for_status()
+        raw = resp.json()
+        if raw.get("error"):
+            raise RuntimeError(f"kraken OHLC: {raw['error']}")
+        result = raw["result"]
+        seeding = self.ohlc_since is None
+        #newest bar is still forming, only keep committed ones
+        for row in result["XXBTZUSD"][:-1]:
+            vwap = float(row[5]) or float(row[4])
+            self.series.add(float(row[0]), vwap, float(row[6]))
+            self.ohlc_last = float(row[0])
+        self.ohlc_since = result.get("last", self.ohlc_since)
+        if seeding:
+            #a week of bars replaces an ema built from the few prices seen so far,
+            #the next live price carries it on
+            self.series.seed_ema()
+        self.refresh_changes()
+
+    def bars_due(self):
+        #bar t closes at t + BAR_SECS, so a new committed bar exists from t + 2 * BAR_SECS.
+        #bars made from live prices don't count, the exchange's own replace them
+        last = self.ohlc_last
+        return last is None or time.time() - last >= 2 * BAR_SECS
+
+    def apply_tick(self, vwap, ask, bid):
+        """A live kraken websocket tick replaces kraken's quote and counts as a successful fetch."""
+        tick = Quote("kraken", vwap, bid, ask)
+        self.apply_quotes([q for q in self.quotes if q.source != "kraken"] + [tick])
+        self.success = True
+        self.request_error_count = 0
+        self.mark_fresh()
+
+    def fetch_quotes(self):
+        """Hedged fan-out: quotes from the first `quorum` exchanges to answer."""
+        live = [ex for ex in self.exchanges if ex.health.available()] or self.exchanges
+        futures = [self.pool.submit(ex.quote, self.http) for ex in live]
+        quotes = []
         try:
-            resp = requests.get(url, timeout=5)
-            resp.raise_for_status()
-            raw = resp.json()
-            self.request_error_count = 0
-            with open(CACHE_FILE, "w") as f:
-                json.dump(raw, f)
-            self.success = True
-        except Exception:
+            for fut in as_completed(futures, timeout=getattr(self.http, "timeout", 5) + 1):
+                try:
+                    quotes.append(fut.result())
+                except Exception as e:
+                    print(f"Error fetching price quote: {e}")
+                if len(quotes) >= self.quorum:
+                    break
+        except TimeoutError:
+            pass
+        return quotes
+
+    def apply_quotes(self, quotes):
+        self.quotes = quotes
+        #shown price: the median of each exchange's current mid, one slow or
+        #off exchange can't move it
+        mid = median([(q.bid + q.ask) / 2 for q in quotes])
+        vwap = median([q.vwap for q in quotes if q.vwap is not None])
+        #every quote and tick goes into the series, the ema and bars move between OHLC loads
+        self.series.sample(time.time(), mid)
+        self.set_price(mid, vwap, median([q.ask for q in quotes]), median([q.bid for q in quotes]))
+
+    def update(self):
+        quotes = self.fetch_quotes()
+        if len(quotes) < self.quorum:
             self.success = False
             self.request_error_count += 1
-            if os.path.exists(CACHE_FILE):
-                with open(CACHE_FILE, "r") as f:
-                    raw = json.load(f)
-            else:
-                print("Failed to fetch Kraken price and no cache available.")
-                return
+            print(f"Price quorum not met: {len(quotes)}/{self.quorum}")
+            self.mark_failed()
+            return
 
-        try:
-            data = raw["result"]["XXBTZUSD"]
-            vwap = float(data["p"][1])
-            ask = float(data["a"][0])
-            bid = float(data["b"][0])
-            avg = (ask + bid) / 2
-            self.trend = "^" if avg > vwap else "v"
-            self.price = vwap
-        except KeyError:
-            print("Error parsing Kraken API response")
+        self.request_error_count = 0
+        self.success = True
+        self.apply_quotes(quotes)
+        self.mark_fresh()
+
+        if self.bars_due():
+            try:
+                self.update_bars()
+            except Exception as e:
+                print(f"Error fetching Kraken OHLC: {e}")
+
+    def report(self):
+        return [f"{ex.name}: {ex.health.summary()}" for ex in self.exchanges]
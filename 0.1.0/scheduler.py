@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+
+import random
+import time
+
+EXPECTED_BLOCK_SECS = 600
+
+
+class TokenBucket:
+    """Per-host request budget: `per_min` requests a minute, bursts up to `burst`."""
+    def __init__(self, per_min, burst=None, now=None):
+        self.rate = per_min / 60.0
+        self.capacity = burst or max(1, per_min // 4)
+        self.tokens = float(self.capacity)
+        self.stamp = now or time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def wait(self, now):
+        """Seconds until a token is available, 0 if one is now."""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self, now):
+        wait = self.wait(now)
+        if not wait:
+            self.tokens -= 1
+        return wait
+
+    def spend(self, count, now):
+        """Charge requests already sent. Tokens may go negative, later polls then wait longer."""
+        self._refill(now)
+        self.tokens -= count
+
+
+class SourceStats:
+    def __init__(self, base):
+        self.base = base
+        self.started = time.monotonic()
+        self.polls = 0
+        self.requests = 0  # http requests, a poll can send more than one
+        self.deferred = 0
+
+    def saved(self, now):
+        #what a fixed `base` period would have fired since start, minus what we actually sent
+        fixed = int((now - self.started) / self.base) + 1
+        return max(0, fixed - self.polls)
+
+
+class AdaptiveScheduler:
+    """
+    Decides each source's next poll interval from context instead of a fixed period:
+    - block-aware sources poll slowly right after a block and speed up as the
+      expected block time (10 min) approaches,
+    - failing sources back off exponentially with full jitter,
+    - every host stays inside a per-minute request budget.
+    """
+    def __init__(self, host_budget=12, min_interval=5, max_backoff=600,
+                 slow_after_block=3.0, fast_near_due=0.5):
+        self.host_budget = host_budget
+        self.min_interval = min_interval
+        self.max_backoff = max_backoff
+        self.slow_after_block = slow_after_block
+        self.fast_near_due = fast_near_due
+        self.buckets = {}
+        self.stats = {}
+
+    def register(self, name, base):
+        self.stats[name] = SourceStats(base)
+
+    def block_factor(self, block_age, expected=None):
+        #3x the base period for the first 2 minutes, easing to 0.5x once a block is due.
+        #expected: the recent mean block interval, 10 minutes until enough blocks are indexed
+        expected = max(240, expected or EXPECTED_BLOCK_SECS)
+        if block_age < 120:
+            return self.slow_after_block
+        if block_age >= expected:
+            return self.fast_near_due
+        span = (block_age - 120) / (expected - 120)
+        return self.slow_after_block + span * (self.fast_near_due - self.slow_after_block)
+
+    def interval(self, base, errors=0, block_timestamp=None, now=None, block_interval=None):
+        """Seconds until the next poll of a source with period `base`."""
+        if errors > 0:
+            ceiling = min(self.max_backoff, base * (2 ** min(errors, 8)))
+            return random.uniform(base, max(base, ceiling))
+        if block_timestamp:
+            age = (now or time.time()) - block_timestamp
+            return max(self.min_interval, base * self.block_factor(age, block_interval))
+        return base
+
+    def admit(self, name, hosts, now=None):
+        """
+        Charge one request against each of `hosts`' budgets (a price poll asks every exchange).
+        Returns 0 when the poll may go ahead, else seconds to wait before retrying, and
+        a deferred poll takes nothing. Requests beyond these are paid with charge().
+        """
+        now = now or time.monotonic()
+        buckets = [self._bucket(host, now) for host in hosts]
+        wait = max(bucket.wait(now) for bucket in buckets)
+        if not wait:
+            for bucket in buckets:
+                bucket.take(now)
+        stats = self.stats.get(name)
+        if stats:
+            if wait:
+                stats.deferred += 1
+            else:
+                stats.polls += 1
+                stats.requests += len(buckets)
+        return wait
+
+    def charge(self, name, host, count, now=None):
+        """Charge `count` more requests a poll sent (block fetches a list when the tip changes)."""
+        now = now or time.monotonic()
+        self._bucket(host, now).spend(count, now)
+        stats = self.stats.get(name)
+        if stats:
+            stats.requests += count
+
+    def _bucket(self, host, now):
+        bucket = self.buckets.get(host)
+        if bucket is None:
+            bucket = self.buckets[host] = TokenBucket(self.host_budget, now=now)
+        return bucket
+
+    def report(self):
+        now = time.monotonic()
+        lines = []
+        for name, s in self.stats.items():
+            lines.append(f"{name}: {s.polls} polls ({s.requests} requests), {s.saved(now)} saved vs fixed {s.base}s, {s.deferred} deferred by budget")
+        return lines
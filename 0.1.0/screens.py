@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+
+from dataclasses import dataclass, field
+import ui
+
+
+@dataclass(frozen=True)
+class Screen:
+    name: str
+    draw: object  # draw(lcd, config, snap) -> wall time the content next changes, or None
+    #data sources it shows -> config key holding how old (seconds) that data may be
+    needs: dict = field(default_factory=dict)
+
+
+REGISTRY = {}
+
+
+def register(name, needs=None):
+    """Decorator adding a draw function to the screens config.screens can name."""
+    def add(draw):
+        REGISTRY[name] = Screen(name, draw, dict(needs or {}))
+        return draw
+    return add
+
+
+@register("clock", needs={"price": "wait_price"})
+def _clock(lcd, config, snap):
+    return ui.screen_1_handler(lcd, config, snap.price)
+
+@register("fees", needs={"block": "wait_meta", "fees": "wait_meta"})
+def _fees(lcd, config, snap):
+    return ui.screen_2_handler(lcd, snap.block, snap.fees)
+
+@register("spark", needs={"block": "wait_meta", "fees": "wait_meta"})
+def _spark(lcd, config, snap):
+    return ui.screen_2_spark_handler(lcd, snap.block, snap.fees)
+
+@register("change", needs={"price": "wait_price"})
+def _change(lcd, config, snap):
+    return ui.screen_3_handler(lcd, snap.price)
+
+
+def _names(text):
+    return [n.strip().lower() for n in str(text).split(",") if n.strip()]
+
+
+def rotation(config):
+    """[(Screen, dwell seconds)] from config.screens/screen_dwell, unknown names are skipped with a warning."""
+    names = _names(config.screens)
+    #older configs picked screens with flags
+    if config.fee_sparkline:
+        names = ["spark" if n == "fees" else n for n in names]
+    if config.price_screen and "change" not in names:
+        names.append("change")
+    picked = []
+    for name in names:
+        if name in REGISTRY:
+            picked.append(REGISTRY[name])
+        else:
+            print(f"unknown screen: {name}")
+    if not picked:
+        picked = [REGISTRY["clock"], REGISTRY["fees"]]
+    dwell = []
+    for value in _names(config.screen_dwell):
+        try:
+            dwell.append(max(1, int(value)))
+        except ValueError:
+            print(f"bad screen_dwell value: {value}")
+    #missing dwell values repeat the last one, or wait_scr_chg
+    dwell = dwell or [config.wait_scr_chg]
+    return [(screen, dwell[min(i, len(dwell) - 1)]) for i, screen in enumerate(picked)]
+
+
+def needs(config, *screens):
+    """Sources the given screens show -> the tightest max age any of them asks for."""
+    out = {}
+    for screen in screens:
+        for source, key in screen.needs.items():
+            max_age = getattr(config, key)
+            out[source] = min(out.get(source, max_age), max_age)
+    return out
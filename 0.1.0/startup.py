@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+SCRIPT_ROOT = Path(__file__).resolve().parent
+
+#loaded on first use only (first fetch, setup window, key press, stream connect, config watch), never by importing the app
+LAZY = ("requests", "urllib3", "certifi", "evdev", "termios", "tty", "websocket", "smbus", "ctypes")
+#modules `import main` may pull in, and how long it may take on a desktop. On a Pi Zero pass --ms 600
+MODULE_BUDGET = 90
+MS_BUDGET = 150
+
+
+def parse(stderr):
+    """-X importtime output -> [(name, self us, cumulative us, depth)] for everything imported after site."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(own), int(cumulative), depth))
+        if name.strip() == "site" and depth == 0:
+            rows = []  # the interpreter's own startup, not ours
+    return rows
+
+
+def measure(module="main"):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=SCRIPT_ROOT, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+    )
+    rows = parse(result.stderr)
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr.splitlines()[-1]}")
+    return rows
+
+
+def main():
+    ms_budget = MS_BUDGET
+    if "--ms" in sys.argv:
+        ms_budget = float(sys.argv[sys.argv.index("--ms") + 1])
+    runs = [measure() for _ in range(5)]
+    #the first run may be writing .pyc files
+    times = [next(c for name, _, c, depth in rows if name == "main" and depth == 0) / 1000 for rows in runs[1:]]
+    rows = runs[-1]
+    names = [name for name, _, _, _ in rows]
+
+    print(f"import main: {statistics.median(times):.1f} ms median, {min(times):.1f} ms best, {len(names)} modules")
+    for name, own, _, _ in sorted(rows, key=lambda r: -r[1])[:10]:
+        print(f"  {own / 1000:6.1f} ms  {name}")
+
+    failures = []
+    eager = sorted({name.split(".")[0] for name in names} & set(LAZY))
+    if eager:
+        failures.append(f"imported at startup but should be lazy: {', '.join(eager)}")
+    if len(names) > MODULE_BUDGET:
+        failures.append(f"{len(names)} modules, budget {MODULE_BUDGET}")
+    if statistics.median(times) > ms_budget:
+        failures.append(f"{statistics.median(times):.1f} ms, budget {ms_budget:.0f} ms")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        sys.exit(1)
+    print("ok, within budget")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+
+import json
+import random
+import threading
+import time
+
+MEMPOOL_WS_URL = "wss://mempool.space/api/v1/ws"
+KRAKEN_WS_URL = "wss://ws.kraken.com/v2"
+
+
+class WebSocketStream:
+    """
+    Base for push data sources. Runs a reader thread that connects, subscribes,
+    hands every decoded message to on_message() and reconnects with backoff.
+    Needs python3-websocket (websocket-client); without it the stream never
+    connects and the fetch engine just keeps polling.
+    """
+    name = "stream"
+
+    def __init__(self, url, recv_timeout=60, backoff_min=1, backoff_max=120):
+        self.url = url
+        self.recv_timeout = recv_timeout
+        self.backoff_min = backoff_min
+        self.backoff_max = backoff_max
+        self.connected = False
+        self.messages = 0
+        self.reconnects = 0
+        self.last_message = 0.0
+        self.on_state = None  # called with True/False when the connection goes up/down
+        self._ws = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def subscribe(self, ws):
+        pass
+
+    def on_message(self, msg):
+        pass
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f"{self.name}-ws", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        ws = self._ws
+        if ws is not None:
+            try:
+                ws.close()
+            except Exception:
+                pass
+
+    def _set_connected(self, state):
+        if state != self.connected:
+            self.connected = state
+            if self.on_state:
+                self.on_state(state)
+
+    def _run(self):
+        try:
+            import websocket
+        except ImportError:
+            print(f"{self.name}: websocket-client not installed, staying on polling")
+            return
+
+        delay = self.backoff_min
+        while not self._stop.is_set():
+            try:
+                self._ws = websocket.create_connection(self.url, timeout=self.recv_timeout)
+                self.subscribe(self._ws)
+                self._set_connected(True)
+                delay = self.backoff_min
+                while not self._stop.is_set():
+                    raw = self._ws.recv()
+                    if not raw:
+                        raise ConnectionError("socket closed")
+                    self.messages += 1
+                    self.last_message = time.time()
+                    self.on_message(json.loads(raw))
+            except Exception as e:
+                if not self._stop.is_set():
+                    print(f"{self.name}: stream error: {e}")
+            finally:
+                self._set_connected(False)
+                if self._ws is not None:
+                    try:
+                        self._ws.close()
+                    except Exception:
+                        pass
+                    self._ws = None
+
+            if self._stop.is_set():
+                break
+            #full jitter keeps a fleet of devices from reconnecting in lockstep
+            self.reconnects += 1
+            self._stop.wait(random.uniform(self.backoff_min, delay))
+            delay = min(self.backoff_max, delay * 2)
+
+
+class MempoolStream(WebSocketStream):
+    """
+    mempool.space push feed ('blocks' and 'stats' channels).
+    on_block(metadata) fires the moment a block arrives, on_blocks(list) with the
+    recent blocks sent right after subscribing, on_fees(fees) on every stats push.
+    """
+    name = "mempool"
+
+    def __init__(self, on_block, on_fees, on_blocks=None, url=MEMPOOL_WS_URL, **kwargs):
+        super().__init__(url, **kwargs)
+        self.on_block = on_block
+        self.on_blocks = on_blocks
+        self.on_fees = on_fees
+
+    def subscribe(self, ws):
+        ws.send(json.dumps({"action": "want", "data": ["blocks", "stats"]}))
+
+    def on_message(self, msg):
+        if "block" in msg:
+            self.on_block(msg["block"])
+        elif msg.get("blocks"):
+            #initial push after subscribing
+            if self.on_blocks:
+                self.on_blocks(msg["blocks"])
+            else:
+                self.on_block(max(msg["blocks"], key=lambda b: b.get("height", 0)))
+        if "fees" in msg:
+            self.on_fees(msg["fees"])
+
+
+class KrakenStream(WebSocketStream):
+    """
+    Kraken public v2 'ticker' channel. on_tick(vwap, ask, bid) fires for every tick.
+    Resubscribes if heartbeats keep arriving but ticks stop (a dropped
+    subscription looks exactly like that).
+    """
+    name = "kraken"
+
+    def __init__(self, on_tick, symbol="BTC/USD", url=KRAKEN_WS_URL, resubscribe_after=120, **kwargs):
+        super().__init__(url, **kwargs)
+        self.on_tick = on_tick
+        self.symbol = symbol
+        self.resubscribe_after = resubscribe_after
+        self.resubscribes = 0
+        self.last_tick = 0.0
+
+    def subscribe(self, ws):
+        self.last_tick = time.time()
+        ws.send(json.dumps({"method": "subscribe", "params": {"channel": "ticker", "symbol": [self.symbol]}}))
+
+    def on_message(self, msg):
+        channel = msg.get("channel")
+        if channel == "heartbeat":
+            if time.time() - self.last_tick > self.resubscribe_after:
+                self.resubscribes += 1
+                self.subscribe(self._ws)
+            return
+        if msg.get("method") == "subscribe" and not msg.get("success", True):
+            raise ConnectionError(f"subscribe rejected: {msg.get('error')}")
+        if channel != "ticker":
+            return
+        for tick in msg.get("data", []):
+            if tick.get("symbol") != self.symbol:
+                continue
+            ask = float(tick["ask"])
+            bid = float(tick["bid"])
+            self.last_tick = time.time()
+            self.on_tick(float(tick["vwap"]), ask, bid)
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+#block index: gaps left by pushes are filled by the bulk catch-up, reorgs, mean interval
+
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import cache
+import block
+
+
+def meta(height, branch="0"):
+    return {"height": height, "id": f"{height:063x}{branch}", "timestamp": height * 600, "tx_count": 1}
+
+
+class BlockIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache_dir, cache.CACHE_DIR = cache.CACHE_DIR, Path(self.tmp.name)
+        self.block = block.BlockMetadata()
+        self.block.apply_blocks([meta(h) for h in range(86, 101)])
+
+    def tearDown(self):
+        cache.CACHE_DIR = self.cache_dir
+        self.tmp.cleanup()
+
+    def heights(self):
+        return [b.height for b in self.block.blocks]
+
+    def test_catch_up_fills_the_gap(self):
+        self.block.apply_block(meta(105))
+        self.assertTrue(self.block.catchup_needed)
+        self.assertEqual(self.block.missing(), [101, 102, 103, 104])
+        self.block.apply_blocks([meta(h) for h in range(91, 106)])
+        self.assertEqual(self.heights(), list(range(86, 106)))
+        self.assertFalse(self.block.catchup_needed)
+        self.assertEqual(self.block.height, 105)
+
+    def test_gap_above_the_bulk_list_keeps_catching_up(self):
+        self.block.apply_block(meta(110))
+        self.block.apply_blocks([meta(h) for h in range(92, 107)])
+        self.assertEqual(self.block.missing(), [107, 108, 109])
+        self.assertTrue(self.block.catchup_needed)
+        self.assertEqual(self.block.height, 110)
+
+    def test_gap_below_the_bulk_list_is_dropped(self):
+        self.block.apply_block(meta(200))
+        self.block.apply_blocks([meta(h) for h in range(186, 201)])
+        self.assertEqual(self.heights(), list(range(186, 201)))
+        self.assertFalse(self.block.catchup_needed)
+
+    def test_reorg_replaces_the_branch(self):
+        self.block.apply_blocks([meta(99, "f"), meta(100, "f"), meta(101)])
+        self.assertEqual(self.block.reorgs, 1)
+        self.assertEqual([b.hash[-1] for b in self.block.blocks][-3:], ["f", "f", "0"])
+        self.assertEqual(self.heights(), list(range(86, 102)))
+
+    def test_avg_interval_by_height(self):
+        self.block.apply_block(meta(105))
+        self.assertEqual(self.block.avg_interval(), 600)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+#price quorum, median and hedged fan-out against stub exchanges on localhost
+
+import json
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import cache
+import price
+import transport
+from scheduler import AdaptiveScheduler
+
+
+class StubExchanges:
+    """
+    One local http server standing in for every exchange: /<name> answers with
+    that exchange's ticker json after `delay` seconds, or `status` if it's set
+    to fail. Counts the requests each one got.
+    """
+    def __init__(self):
+        self.routes = {}  # name -> {"body": dict, "delay": s, "status": code}
+        self.hits = {}
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                name = self.path.strip("/")
+                route = stub.routes.get(name)
+                stub.hits[name] = stub.hits.get(name, 0) + 1
+                if route is None:
+                    self.send_error(404)
+                    return
+                time.sleep(route.get("delay", 0))
+                status = route.get("status", 200)
+                body = json.dumps(route["body"]).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def url(self, name):
+        return f"http://127.0.0.1:{self.server.server_address[1]}/{name}"
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def kraken(vwap, bid, ask):
+    return {"error": [], "result": {"XXBTZUSD": {"p": [str(vwap), str(vwap)], "b": [str(bid), "1", "1"], "a": [str(ask), "1", "1"]}}}
+
+def coinbase(bid, ask):
+    return {"bid": str(bid), "ask": str(ask)}
+
+def bitstamp(vwap, bid, ask):
+    return {"vwap": str(vwap), "bid": str(bid), "ask": str(ask)}
+
+
+class PriceQuorumTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache_dir, cache.CACHE_DIR = cache.CACHE_DIR, Path(self.tmp.name)
+        self.stub = StubExchanges()
+        self.stub.routes = {
+            "kraken": {"body": kraken(60000, 60100, 60110)},
+            "coinbase": {"body": coinbase(60200, 60210)},
+            "bitstamp": {"body": bitstamp(59000, 59900, 59910)},
+        }
+        self.http = transport.Transport(timeout=3)
+
+    def tearDown(self):
+        self.stub.close()
+        cache.CACHE_DIR = self.cache_dir
+        self.tmp.cleanup()
+
+    def fetcher(self, quorum):
+        p = price.PriceFetcher(http=self.http, sources="kraken,coinbase,bitstamp", quorum=quorum)
+        for ex in p.exchanges:
+            ex.url = self.stub.url(ex.name)
+        p.bars_due = lambda: False  # no OHLC bars, only quotes
+        return p
+
+    def test_median_of_current_prices(self):
+        p = self.fetcher(quorum=3)
+        p.update()
+        self.assertTrue(p.success)
+        #mids 60105, 60205, 59905: the median mid, not a vwap
+        self.assertEqual(p.price, 60105)
+        self.assertEqual(p.vwap, (60000 + 59000) / 2)
+        self.assertEqual(len(p.quotes), 3)
+
+    def test_trend_against_the_ema(self):
+        p = self.fetcher(quorum=3)
+        p.update()
+        #one price: the ema is that price, no direction yet
+        self.assertEqual(p.series.ema, 60105)
+        self.assertEqual(p.trend, "-")
+        time.sleep(0.05)
+        self.stub.routes["kraken"]["body"] = kraken(60000, 60300, 60310)
+        self.stub.routes["coinbase"]["body"] = coinbase(60400, 60410)
+        p.update()
+        self.assertEqual(p.price, 60305)
+        self.assertTrue(60105 < p.series.ema < 60305)
+        self.assertEqual(p.trend, "^")
+        self.assertEqual(p.series.live[2], 2)  # both prices are in the forming bar
+        self.assertEqual(len(p.quotes), 3)
+
+    def test_quorum_met(self):
+        self.stub.routes["bitstamp"]["status"] = 500
+        p = self.fetcher(quorum=2)
+        p.update()
+        self.assertTrue(p.success)
+        self.assertEqual(p.request_error_count, 0)
+        self.assertEqual(p.price, (60105 + 60205) / 2)
+        self.assertFalse(p.is_stale())
+
+    def test_quorum_not_met(self):
+        self.stub.routes["bitstamp"]["status"] = 500
+        self.stub.routes["coinbase"]["status"] = 500
+        p = self.fetcher(quorum=2)
+        before = p.price
+        p.update()
+        self.assertFalse(p.success)
+        self.assertEqual(p.price, before)
+        self.assertTrue(p.is_stale())
+
+    def test_hedged_fan_out_skips_slow_exchange(self):
+        self.stub.routes["coinbase"]["delay"] = 2
+        p = self.fetcher(quorum=2)
+        start = time.monotonic()
+        p.update()
+        took = time.monotonic() - start
+        self.assertTrue(p.success)
+        self.assertLess(took, 1.5)
+        self.assertEqual(sorted(q.source for q in p.quotes), ["bitstamp", "kraken"])
+        self.assertEqual(p.price, (60105 + 59905) / 2)
+
+    def test_failing_exchange_rests(self):
+        self.stub.routes["bitstamp"]["status"] = 500
+        p = self.fetcher(quorum=2)
+        bitstamp_ex = next(ex for ex in p.exchanges if ex.name == "bitstamp")
+        #fails_to_rest failures in a row put it on a cool-down
+        for n in range(1, bitstamp_ex.health.fails_to_rest + 1):
+            p.update()
+            #update() returns on quorum, the failing request may still be finishing
+            deadline = time.monotonic() + 2
+            while bitstamp_ex.health.fail_count < n and time.monotonic() < deadline:
+                time.sleep(0.01)
+        self.assertFalse(bitstamp_ex.health.available())
+        hits = self.stub.hits["bitstamp"]
+        p.update()
+        self.assertTrue(p.success)
+        self.assertEqual(self.stub.hits["bitstamp"], hits)
+        self.assertIn("resting", bitstamp_ex.health.summary())
+
+    def test_requests_counted_per_host(self):
+        other = StubExchanges()
+        self.addCleanup(other.close)
+        other.routes = {"coinbase": self.stub.routes["coinbase"]}
+        p = self.fetcher(quorum=3)
+        p.exchanges[1].url = other.url("coinbase")
+        p.http = counting = transport.Counting(self.http)
+        p.update()
+        here, there = (transport.host_of(self.stub.url("")), transport.host_of(other.url("")))
+        self.assertEqual(counting.sent, {here: 2, there: 1})
+        #a poll is admitted against every host it asks, a deferred one takes nothing
+        scheduler = AdaptiveScheduler(host_budget=4)
+        self.assertEqual(scheduler.admit("price", [here, there]), 0)
+        scheduler.charge("price", here, 1)
+        self.assertLess(scheduler.buckets[here].tokens, scheduler.buckets[there].tokens)
+        self.assertGreater(scheduler.admit("price", [here, "spare"]), 0)
+        self.assertEqual(scheduler.buckets["spare"].tokens, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
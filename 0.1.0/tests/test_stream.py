@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+#push streams against a local websocket server: pushes, reconnects and the polling fallback
+
+import base64
+import hashlib
+import json
+import socket
+import struct
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import cache
+import block
+import commands
+import fees
+import fetcher
+import price
+import stream
+
+GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+class StubWebSocket:
+    """
+    Bare websocket server on localhost, just enough for websocket-client:
+    the upgrade handshake, masked frames in, unmasked text frames out.
+    Each connection runs `script(server, conn)`; returning from it drops the
+    connection without a close frame, like a dead server would.
+    Handshakes are refused (connection closed first) while `refuse` is set.
+    Scripts that hold the connection open wait on `done`, set by close().
+    """
+    def __init__(self, script):
+        self.script = script
+        self.refuse = False
+        self.done = threading.Event()
+        self.attempts = []  # monotonic time of every incoming connection
+        self.received = []  # json messages the clients sent
+        self.sock = socket.socket()
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen()
+        self.url = f"ws://127.0.0.1:{self.sock.getsockname()[1]}/"
+        self._stop = False
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while not self._stop:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            self.attempts.append(time.monotonic())
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        try:
+            request = b""
+            while b"\r\n\r\n" not in request:
+                chunk = conn.recv(1024)
+                if not chunk:
+                    return
+                request += chunk
+            if self.refuse:
+                return
+            key = next(line.split(":", 1)[1].strip() for line in request.decode().split("\r\n") if line.lower().startswith("sec-websocket-key"))
+            accept = base64.b64encode(hashlib.sha1((key + GUID).encode()).digest()).decode()
+            conn.sendall((
+                "HTTP/1.1 101 Switching Protocols\r\n"
+                "Upgrade: websocket\r\nConnection: Upgrade\r\n"
+                f"Sec-WebSocket-Accept: {accept}\r\n\r\n"
+            ).encode())
+            self.script(self, conn)
+        except OSError:
+            pass
+        finally:
+            conn.close()
+
+    def read(self, conn):
+        """One text frame from the client, decoded json."""
+        head = self._exact(conn, 2)
+        length = head[1] & 0x7f
+        if length == 126:
+            length = struct.unpack(">H", self._exact(conn, 2))[0]
+        elif length == 127:
+            length = struct.unpack(">Q", self._exact(conn, 8))[0]
+        mask = self._exact(conn, 4)
+        data = bytes(b ^ mask[i % 4] for i, b in enumerate(self._exact(conn, length)))
+        msg = json.loads(data)
+        self.received.append(msg)
+        return msg
+
+    def send(self, conn, msg):
+        data = json.dumps(msg).encode()
+        if len(data) < 126:
+            head = struct.pack(">BB", 0x81, len(data))
+        else:
+            head = struct.pack(">BBH", 0x81, 126, len(data))
+        conn.sendall(head + data)
+
+    def _exact(self, conn, n):
+        buf = b""
+        while len(buf) < n:
+            chunk = conn.recv(n - len(buf))
+            if not chunk:
+                raise OSError("client went away")
+            buf += chunk
+        return buf
+
+    def close(self):
+        self.done.set()
+        self._stop = True
+        self.sock.close()
+
+
+def wait_for(check, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if check():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def block_dict(height):
+    return {"height": height, "id": f"{height:064x}", "timestamp": int(time.time()) - 60, "tx_count": 3000}
+
+FEES = {"fastestFee": 12, "halfHourFee": 8, "hourFee": 4, "economyFee": 2}
+
+
+class MempoolStreamTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache_dir, cache.CACHE_DIR = cache.CACHE_DIR, Path(self.tmp.name)
+        self.ws = None
+        self.streams = []
+
+    def tearDown(self):
+        if self.ws:
+            self.ws.close()
+        for s in self.streams:
+            s.stop()
+        cache.CACHE_DIR = self.cache_dir
+        self.tmp.cleanup()
+
+    def mempool(self, **callbacks):
+        s = stream.MempoolStream(url=self.ws.url, recv_timeout=2, backoff_min=0.05, backoff_max=0.4, **callbacks)
+        self.streams.append(s)
+        return s
+
+    def test_block_and_fee_pushes(self):
+        def script(server, conn):
+            server.read(conn)  # the subscription
+            server.send(conn, {"blocks": [block_dict(800000), block_dict(800001)]})
+            server.send(conn, {"block": block_dict(800002)})
+            server.send(conn, {"fees": FEES})
+            server.done.wait(5)
+        self.ws = StubWebSocket(script)
+        got = {"block": [], "blocks": [], "fees": []}
+        s = self.mempool(
+            on_block=got["block"].append,
+            on_blocks=got["blocks"].append,
+            on_fees=got["fees"].append,
+        ).start()
+        self.assertTrue(wait_for(lambda: got["fees"]))
+        self.assertEqual(self.ws.received[0], {"action": "want", "data": ["blocks", "stats"]})
+        self.assertEqual([b["height"] for b in got["blocks"][0]], [800000, 800001])
+        self.assertEqual([b["height"] for b in got["block"]], [800002])
+        self.assertEqual(got["fees"], [FEES])
+        self.assertTrue(s.connected)
+        self.assertEqual(s.messages, 3)
+
+    def test_pushes_reach_the_snapshot(self):
+        def script(server, conn):
+            server.read(conn)
+            server.send(conn, {"block": block_dict(800010)})
+            server.send(conn, {"fees": FEES})
+            server.done.wait(5)
+        self.ws = StubWebSocket(script)
+        engine = self.engine()
+        self.mempool(
+            on_block=lambda meta: engine.push("block", lambda b: b.apply_block(meta)),
+            on_fees=lambda data: engine.push("fees", lambda f: f.apply(data)),
+        ).start()
+        self.assertTrue(wait_for(lambda: engine.snapshot().fees.fastest == 12))
+        snap = engine.snapshot()
+        self.assertEqual(snap.block.height, 800010)
+        self.assertFalse(snap.block.stale)
+
+    def test_reconnects_with_backoff(self):
+        def script(server, conn):
+            server.read(conn)
+            server.send(conn, {"fees": FEES})
+            #then the server drops the connection
+        self.ws = StubWebSocket(script)
+        states = []
+        s = self.mempool(on_block=lambda b: None, on_fees=lambda f: None)
+        s.on_state = states.append
+        #the first connection works, then three handshakes fail in a row
+        s.start()
+        self.assertTrue(wait_for(lambda: len(self.ws.attempts) >= 1))
+        self.ws.refuse = True
+        self.assertTrue(wait_for(lambda: len(self.ws.attempts) >= 4))
+        self.ws.refuse = False
+        self.assertTrue(wait_for(lambda: s.connected or states.count(True) >= 2))
+        self.assertGreaterEqual(s.reconnects, 4)
+        self.assertEqual(states[:2], [True, False])
+        gaps = [b - a for a, b in zip(self.ws.attempts, self.ws.attempts[1:4])]
+        #full jitter between backoff_min and the doubling delay, capped at backoff_max
+        for gap in gaps:
+            self.assertGreaterEqual(gap, s.backoff_min * 0.9)
+            self.assertLess(gap, s.backoff_max + 0.3)
+
+    def test_dropped_stream_falls_back_to_polling(self):
+        dropped = threading.Event()
+        def script(server, conn):
+            server.read(conn)
+            dropped.wait(5)
+        self.ws = StubWebSocket(script)
+        engine = self.engine()
+        polls = {"block": 0}
+        block_now = engine.sources["block"].obj
+        def update():
+            polls["block"] += 1
+            block_now.success = True
+        block_now.update = update
+        engine.start()
+        self.addCleanup(engine.stop)
+        self.assertTrue(wait_for(lambda: polls["block"] == 1))
+
+        s = self.mempool(on_block=lambda b: None, on_fees=lambda f: None)
+        s.on_state = lambda up: engine.set_streaming(up, "block", "fees")
+        s.start()
+        self.assertTrue(wait_for(lambda: engine.sources["block"].streaming))
+        #next poll is wait_meta (10s) away, stretched while the stream is up
+        time.sleep(0.3)
+        self.assertEqual(polls["block"], 1)
+
+        self.ws.refuse = True
+        dropped.set()
+        self.assertTrue(wait_for(lambda: not engine.sources["block"].streaming))
+        self.assertTrue(wait_for(lambda: polls["block"] == 2, timeout=1))
+
+    def engine(self):
+        config = commands.Config(24, 6, 10, 60, 1, 3, "auto", 5)
+        block_now, fees_now = block.BlockMetadata(), fees.FeeStats()
+        price_now = price.PriceFetcher()
+        for src in (fees_now, price_now):
+            src.update = lambda: None
+        return fetcher.FetchEngine(config, block_now, fees_now, price_now)
+
+
+class KrakenStreamTest(unittest.TestCase):
+    def test_ticks(self):
+        def script(server, conn):
+            server.read(conn)
+            server.send(conn, {"method": "subscribe", "success": True})
+            server.send(conn, {"channel": "ticker", "data": [{"symbol": "BTC/USD", "vwap": 60000.5, "ask": 60101, "bid": 60099}]})
+            server.send(conn, {"channel": "ticker", "data": [{"symbol": "ETH/USD", "vwap": 1, "ask": 1, "bid": 1}]})
+            server.done.wait(5)
+        ws = StubWebSocket(script)
+        ticks = []
+        s = stream.KrakenStream(on_tick=lambda *t: ticks.append(t), url=ws.url, recv_timeout=2, backoff_min=0.05)
+        #cleanups run last first: the server lets go, then the stream stops
+        self.addCleanup(s.stop)
+        self.addCleanup(ws.close)
+        s.start()
+        self.assertTrue(wait_for(lambda: ticks))
+        time.sleep(0.1)
+        self.assertEqual(ticks, [(60000.5, 60101.0, 60099.0)])
+        self.assertEqual(ws.received[0]["params"], {"channel": "ticker", "symbol": ["BTC/USD"]})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+
+import time
+
+
+def next_boundary(period, now=None):
+    """Next wall-clock time that is a whole multiple of `period` seconds (next second, next minute...)."""
+    now = time.time() if now is None else now
+    return (now // period + 1) * period
+
+
+def _sleep(seconds):
+    time.sleep(seconds)
+    return False
+
+
+class TickScheduler:
+    """
+    Sleeps until wall-clock deadlines, e.g. the next minute for a %H:%M clock.
+    The wait runs on the monotonic clock so a clock step can't stretch it, and
+    the wall/monotonic offset is checked after every wake, so a jump (first NTP
+    sync, a manual date change) ends the sleep instead of leaving the clock wrong.
+    Sleeps are capped at max_sleep (None: no cap, for a caller that is woken on
+    clock steps some other way) so a jump is noticed within that long.
+    EventLoop builds on this, with its selector as the wait.
+    """
+    def __init__(self, max_sleep=30, jump_threshold=0.5):
+        self.max_sleep = max_sleep
+        self.jump_threshold = jump_threshold
+        self.offset = time.time() - time.monotonic()
+        self.started = time.monotonic()
+        self.wakeups = 0
+        self.jumps = 0
+
+    def to_monotonic(self, wall):
+        return wall - self.offset
+
+    def check_jump(self):
+        offset = time.time() - time.monotonic()
+        jumped = abs(offset - self.offset) > self.jump_threshold
+        if jumped:
+            print(f"Clock jumped {offset - self.offset:+.1f}s")
+            self.jumps += 1
+        #small steps are NTP slewing, just follow them
+        self.offset = offset
+        return jumped
+
+    def sleep_until(self, deadline, wait=None):
+        """
+        Sleep until wall time `deadline`, or until woken if it's None. wait(timeout)
+        returning True cuts the sleep short (new data arrived), a None timeout
+        waits for that alone. Returns "due", "woken" or "jumped".
+        """
+        wait = wait or _sleep
+        while True:
+            left = None if deadline is None else self.to_monotonic(deadline) - time.monotonic()
+            if left is not None and left <= 0:
+                return "due"
+            if self.max_sleep is not None:
+                left = self.max_sleep if left is None else min(left, self.max_sleep)
+            woken = wait(left)
+            self.wakeups += 1
+            if self.check_jump():
+                return "jumped"
+            if woken:
+                return "woken"
+
+    def report(self):
+        minutes = max(1 / 60, (time.monotonic() - self.started) / 60)
+        return [f"ticks: {self.wakeups / minutes:.1f} wakeups/min, {self.jumps} clock jumps"]
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+
+import threading
+import time
+from collections import deque
+
+
+class Animation:
+    """
+    One thing shown on one or more lines for a while. duration=None means it
+    stays until something else is queued on its line.
+    Subclasses implement render(t) -> texts (one per line) and changes(t) ->
+    seconds since start of the next visible change, or None if it won't change.
+    """
+    lines = (0,)
+
+    def __init__(self, duration=None):
+        self.duration = duration
+        self.started = None
+        self.cols = 16
+
+    def begin(self, now, cols):
+        self.started = now
+        self.cols = cols
+
+    def finished(self, now):
+        return self.duration is not None and now - self.started >= self.duration
+
+    def render(self, t):
+        raise NotImplementedError
+
+    def changes(self, t):
+        return None
+
+    def next_change(self, now):
+        t = now - self.started
+        due = [x for x in (self.changes(t), self.duration) if x is not None and x > t]
+        return self.started + min(due) if due else None
+
+
+def _center(text, cols):
+    text = text[:cols]
+    padding = cols - len(text)
+    left = (padding + 1) // 2
+    return " " * left + text + " " * (padding - left)
+
+
+class Text(Animation):
+    def __init__(self, line, text, duration=None, center=False):
+        super().__init__(duration)
+        self.lines = (line,)
+        self.text = text
+        self.center = center
+
+    def render(self, t):
+        return (_center(self.text, self.cols) if self.center else self.text,)
+
+
+class Splash(Animation):
+    """Both lines at once, like lcd.center(sleep_time, line0, line1)."""
+    lines = (0, 1)
+
+    def __init__(self, line0, line1, duration=None, center=True):
+        super().__init__(duration)
+        self.texts = (line0, line1)
+        self.center = center
+
+    def render(self, t):
+        if self.center:
+            return tuple(_center(text, self.cols) for text in self.texts)
+        return self.texts
+
+
+class Scroll(Animation):
+    """Scroll once across text wider than the display, then hold the end."""
+    def __init__(self, line, text, step=0.2, hold_start=1, hold_end=2):
+        super().__init__()
+        self.lines = (line,)
+        self.text = text
+        self.step = step
+        self.hold_start = hold_start
+        self.hold_end = hold_end
+
+    def begin(self, now, cols):
+        super().begin(now, cols)
+        self.positions = max(1, len(self.text) - cols + 1)
+        if self.positions == 1:
+            self.hold_start = 0
+        self.duration = self.hold_start + (self.positions - 1) * self.step + self.hold_end
+
+    def _pos(self, t):
+        if t < self.hold_start:
+            return 0
+        return min(self.positions - 1, int((t - self.hold_start) / self.step))
+
+    def render(self, t):
+        i = self._pos(t)
+        return (self.text[i:i + self.cols],)
+
+    def window(self, t):
+        return self.text, self._pos(t)
+
+    def changes(self, t):
+        i = self._pos(t)
+        if t < self.hold_start:
+            return self.hold_start if self.positions > 1 else None
+        if i >= self.positions - 1:
+            return None
+        return self.hold_start + (i + 1) * self.step
+
+
+class Marquee(Animation):
+    """Endless rotating scroll, for text that stays up while something runs."""
+    def __init__(self, line, text, step=0.3, duration=None, gap="   "):
+        super().__init__(duration)
+        self.lines = (line,)
+        self.text = text
+        self.step = step
+        self.gap = gap
+
+    def render(self, t):
+        if len(self.text) <= self.cols:
+            return (self.text,)
+        loop = self.text + self.gap
+        i = int(t / self.step) % len(loop)
+        return ((loop[i:] + loop[:i])[:self.cols],)
+
+    def changes(self, t):
+        if len(self.text) <= self.cols:
+            return None
+        return (int(t / self.step) + 1) * self.step
+
+
+class Blink(Animation):
+    def __init__(self, line, text, period=0.5, duration=None, center=False):
+        super().__init__(duration)
+        self.lines = (line,)
+        self.text = text
+        self.period = period
+        self.center = center
+
+    def render(self, t):
+        if int(t / self.period) % 2:
+            return ("",)
+        return (_center(self.text, self.cols) if self.center else self.text,)
+
+    def changes(self, t):
+        return (int(t / self.period) + 1) * self.period
+
+
+class Timeline:
+    """
+    Animations queued per line and advanced by tick() instead of sleeping.
+    Each line plays its queue in order, different lines run at the same time,
+    and tick() returns how long the caller can sleep before the next change.
+    """
+    def __init__(self, lcd):
+        self.lcd = lcd
+        self.cols = lcd.cols
+        self.queues = [deque() for _ in range(lcd.rows)]
+        self.text = [None] * lcd.rows  # what each line shows, None = never set
+        self.drawn = None
+        self.frames = 0
+        self._lock = threading.Lock()
+
+    def add(self, anim):
+        """Queue anim on its lines, it starts when the ones ahead of it finish."""
+        with self._lock:
+            for line in anim.lines:
+                self.queues[line].append(anim)
+        return anim
+
+    def show(self, line, text, duration=None, center=False):
+        return self.add(Text(line, text, duration, center))
+
+    def splash(self, line0, line1, duration=None, center=True):
+        return self.add(Splash(line0, line1, duration, center))
+
+    def scroll(self, line, text, step=0.2, hold_start=1, hold_end=2):
+        return self.add(Scroll(line, text, step, hold_start, hold_end))
+
+    def marquee(self, line, text, step=0.3, duration=None):
+        return self.add(Marquee(line, text, step, duration))
+
+    def blink(self, line, text, period=0.5, duration=None, center=False):
+        return self.add(Blink(line, text, period, duration, center))
+
+    def _drop_finished(self, now):
+        for q in self.queues:
+            #open-ended animations give way as soon as something is queued behind them
+            while q and q[0].started is not None and (q[0].finished(now) or (q[0].duration is None and len(q) > 1)):
+                q.popleft()
+
+    def tick(self, now=None):
+        """Advance and draw. Returns seconds until the next change, or None if nothing will change."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            started = True
+            while started:
+                self._drop_finished(now)
+                started = False
+                for q in self.queues:
+                    anim = q[0] if q else None
+                    #a two-line splash waits until it's first in line on both lines
+                    if anim and anim.started is None and all(self.queues[l] and self.queues[l][0] is anim for l in anim.lines):
+                        anim.begin(now, self.cols)
+                        started = True
+            due = None
+            scrolls = {}
+            for q in self.queues:
+                if not q or q[0].started is None:
+                    continue
+                anim = q[0]
+                for line, text in zip(anim.lines, anim.render(now - anim.started)):
+                    self.text[line] = text
+                if isinstance(anim, Scroll) and anim.positions > 1:
+                    scrolls[anim.lines[0]] = anim.window(now - anim.started)
+                nxt = anim.next_change(now)
+                if nxt is not None:
+                    due = nxt if due is None else min(due, nxt)
+            frame = list(self.text)
+        if frame != self.drawn:
+            self._draw(frame, scrolls)
+        return None if due is None else max(0.0, due - now)
+
+    def _draw(self, frame, scrolls):
+        #scrolling lines go through scroll_window, which can use the display shift
+        line0, line1 = [None if line in scrolls else text for line, text in enumerate((frame + [None, None])[:2])]
+        self.lcd.output(0, line0 or "", line1 or "", clear_line0=line0 is not None, clear_line1=line1 is not None)
+        for line, (text, pos) in scrolls.items():
+            self.lcd.scroll_window(line, text, pos)
+        self.drawn = frame
+        self.frames += 1
+
+    def idle(self):
+        """True when nothing is queued that will still change the display."""
+        with self._lock:
+            return all(not q or (len(q) == 1 and q[0].started is not None and q[0].duration is None) for q in self.queues)
+
+    def wait(self, timeout=None):
+        """Block, ticking, until the timed animations have played out."""
+        end = None if timeout is None else time.monotonic() + timeout
+        while True:
+            delay = self.tick()
+            if self.idle():
+                return True
+            if end is not None:
+                left = end - time.monotonic()
+                if left <= 0:
+                    return False
+                delay = left if delay is None else min(delay, left)
+            time.sleep(delay if delay is not None else 0.05)
+
+
+def main():
+    from lcd import LCD
+
+    lcd = LCD()
+    timeline = Timeline(lcd)
+    start = time.monotonic()
+    timeline.splash("stay humble", "stack sats", 2)
+    timeline.show(0, "BTC  MON", center=True)
+    timeline.marquee(1, "scrolls, blinks and splashes share one loop", duration=6)
+    timeline.blink(1, "done", duration=2, center=True)
+    timeline.wait()
+    print(f"{timeline.frames} frames in {time.monotonic() - start:.1f}s")
+
+if __name__ == "__main__":
+    main()
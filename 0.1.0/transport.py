@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+
+import time
+import threading
+from urllib.parse import urlsplit
+
+DEFAULT_TIMEOUT = 5
+
+#sockets opened by the request running on this thread, counted where urllib3 opens them
+_local = threading.local()
+
+def host_of(url):
+    """The host a request to url is counted and budgeted under."""
+    return urlsplit(url).netloc
+
+class HostStats:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.last_latency = 0.0
+        self.total_latency = 0.0
+        self.new_connections = 0
+        self.reused_connections = 0
+
+    @property
+    def avg_latency(self):
+        if not self.requests:
+            return 0.0
+        return self.total_latency / self.requests
+
+
+class Transport:
+    """
+    One keep-alive requests.Session shared by every data source.
+    Connections are pooled per host so repeat polls skip the TCP/TLS handshake.
+    The session (and requests itself, the slowest import in the app) is set up
+    on the first request, so creating the sources costs nothing at startup.
+    """
+    def __init__(self, timeout=DEFAULT_TIMEOUT, pool_connections=4, pool_maxsize=4):
+        self.timeout = timeout
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.session = None
+        self.adapter = None
+        self.stats = {}
+        self._lock = threading.Lock()
+
+    def _session(self):
+        with self._lock:
+            if self.session is None:
+                import requests
+                session = requests.Session()
+                session.headers.update({
+                    "Accept-Encoding": "gzip, deflate",
+                    "Connection": "keep-alive",
+                    "User-Agent": "btc-mon",
+                })
+                self.adapter = _counting_adapter()(pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize)
+                session.mount("https://", self.adapter)
+                session.mount("http://", self.adapter)
+                self.session = session
+            return self.session
+
+    def get(self, url, timeout=None, **kwargs):
+        session = self._session()
+        host = host_of(url)
+        _local.opened = 0
+
+        start = time.monotonic()
+        try:
+            resp = session.get(url, timeout=timeout or self.timeout, **kwargs)
+        except Exception:
+            with self._lock:
+                self.stats.setdefault(host, HostStats()).errors += 1
+            raise
+        latency = time.monotonic() - start
+
+        opened = _local.opened
+        with self._lock:
+            stats = self.stats.setdefault(host, HostStats())
+            stats.requests += 1
+            stats.last_latency = latency
+            stats.total_latency += latency
+            if opened > 0:
+                stats.new_connections += opened
+            else:
+                stats.reused_connections += 1
+        return resp
+
+    def report(self):
+        lines = []
+        with self._lock:
+            for host, s in self.stats.items():
+                lines.append(
+                    f"{host}: {s.requests} req, {s.errors} err, "
+                    f"{s.new_connections} new conn, {s.reused_connections} reused, "
+                    f"last {s.last_latency * 1000:.0f}ms, avg {s.avg_latency * 1000:.0f}ms"
+                )
+        return lines
+
+    def close(self):
+        if self.session is not None:
+            self.session.close()
+
+
+def _counting_adapter():
+    """
+    HTTPAdapter whose connection pools count each new socket on the thread
+    that opens it, so concurrent requests to one host can't mix up their
+    counts. Built on first use, requests is only imported then.
+    """
+    from requests.adapters import HTTPAdapter
+    from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+    def counting(pool):
+        class CountingPool(pool):
+            def _new_conn(self):
+                _local.opened = getattr(_local, "opened", 0) + 1
+                return super()._new_conn()
+        return CountingPool
+
+    pools = {"http": counting(HTTPConnectionPool), "https": counting(HTTPSConnectionPool)}
+
+    class CountingAdapter(HTTPAdapter):
+        def init_poolmanager(self, *args, **kwargs):
+            super().init_poolmanager(*args, **kwargs)
+            self.poolmanager.pool_classes_by_scheme = pools
+
+    return CountingAdapter
+
+
+class Counting:
+    """
+    Counts the requests one source sends through a Transport, per host, so
+    each host's budget is charged per request, not per poll. Everything else
+    is the wrapped Transport's.
+    """
+    def __init__(self, http):
+        self.http = http
+        self.sent = {}  # host -> requests sent there
+        self._lock = threading.Lock()  # price quotes go out from several threads
+
+    def get(self, url, **kwargs):
+        host = host_of(url)
+        with self._lock:
+            self.sent[host] = self.sent.get(host, 0) + 1
+        return self.http.get(url, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.http, name)
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+def shared():
+    """Process-wide Transport used by BlockMetadata, FeeStats and PriceFetcher."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = Transport()
+        return _shared
+
+
+def main():
+    t = shared()
+    for _ in range(3):
+        t.get("https://mempool.space/api/blocks/tip/hash")
+    for line in t.report():
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,33 +3,34 @@
 from lcd import LCD
 import select
 import commands
+import ticks
+import layout
 import time
 from datetime import datetime
-import evdev
 import signal
 import subprocess
-import termios
 import sys
-import tty
 import json
 import os
 from dataclasses import asdict
 from pathlib import Path
 
-#testing
-import block
-import fees
+#evdev, termios and tty are imported where they're used: the screens never
+#need them, only the setup window and key presses do
 
 class RawTerminal:
-    def __init__(self, fd=sys.stdin.fileno()):
-        self.fd = fd
+    def __init__(self, fd=None):
+        import termios
+        self.fd = sys.stdin.fileno() if fd is None else fd
         self.original_attrs = termios.tcgetattr(self.fd)
 
     def __enter__(self):
+        import tty
         tty.setraw(self.fd)
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
+        import termios
         termios.tcsetattr(self.fd, termios.TCSADRAIN, self.original_attrs)
         # Flush any leftover keystrokes
         termios.tcflush(self.fd, termios.TCIFLUSH)
@@ -49,15 +50,27 @@ def first_boot():
 def second_boot():
     pass
     
-def check_interactive(lcd, config, SCRIPT_ROOT):
+def check_interactive(lcd, config, SCRIPT_ROOT, timeline=None):
     lcd.line1 = "any key to setup"
-    lcd.center(0, lcd.splash0, lcd.line1)
+    if timeline:
+        #shown after whatever splash is still playing. The key window only opens
+        #once the prompt is actually on screen, so it gets its full wait_config
+        prompt = timeline.splash(lcd.splash0, lcd.line1)
+        while True:
+            delay = timeline.tick()
+            if prompt.started is not None:
+                break
+            time.sleep(0.05 if delay is None else min(delay, 0.25))
+        tick = timeline.tick
+    else:
+        lcd.center(0, lcd.splash0, lcd.line1)
+        tick = None
     
     print("btcmon.service has switched console to tty8 to prevent setup input from executing in interactive tty1 terminal")
     print("use 'sudo systemctl stop btcmon.service' to disble")
     print("see lcd screen for setup")
 
-    if check_initial_keypress(config.wait_config):
+    if check_initial_keypress(config.wait_config, tick):
         def handle_sigint(signum, frame):
             print("\nCaught Ctrl-C (SIGINT), exiting interactive mode")
             raise KeyboardInterrupt()
@@ -75,6 +88,9 @@ def check_interactive(lcd, config, SCRIPT_ROOT):
             # Restore default Ctrl-C handler
             signal.signal(signal.SIGINT, signal.default_int_handler)
             print("Exited interactive mode.")
+    release_console()
+
+def release_console():
     print("btcmon.service has switched console to tty1")
     subprocess.run(["chvt", "1"])
 
@@ -437,7 +453,9 @@ def check_timezone(lcd, config):
             lcd.output(4, "auto tz::", response)
         
 
-def check_initial_keypress(timeout=5):
+def keyboards():
+    """Input devices we can open, for select()/an event loop to watch."""
+    import evdev
     devices = []
     for path in evdev.list_devices():
         try:
@@ -445,55 +463,134 @@ def check_initial_keypress(timeout=5):
             devices.append(device)
         except Exception:
             continue  # skip devices we can't open
-
-    if not devices:
-        time.sleep(timeout)
+    return devices
+
+def key_pressed(device):
+    """Read what's waiting on a readable device, True if it held a key press."""
+    import evdev
+    pressed = False
+    try:
+        for event in device.read():
+            if event.type == evdev.ecodes.EV_KEY and event.value == 1:
+                pressed = True
+    except (BlockingIOError, OSError):
+        pass
+    return pressed
+
+def check_initial_keypress(timeout=5, tick=None):
+    """Wait up to timeout for a key. tick() (e.g. Timeline.tick) keeps animations going meanwhile."""
+    def wait_for(fds, left):
+        delay = tick() if tick else None
+        if delay is not None:
+            left = min(left, delay)
+        if not fds:
+            time.sleep(left)
+            return []
+        r, _, _ = select.select(fds, [], [], left)
+        return r
+
+    import evdev
+    devices = keyboards()
+    try:
+        start_time = time.time()
+        while time.time() - start_time < timeout:
+            timeout_left = timeout - (time.time() - start_time)
+            r = wait_for(devices, timeout_left)
+            for device in r:
+                try:
+                    for event in device.read():
+                        if event.type == evdev.ecodes.EV_KEY and event.value == 1:
+                            key_event = evdev.ecodes.KEY.get(event.code, event.code)
+                            print(f"Key pressed: {key_event}")
+                            return True
+                except BlockingIOError:
+                    continue
         return False
-
-    start_time = time.time()
-    while time.time() - start_time < timeout:
-        timeout_left = timeout - (time.time() - start_time)
-        r, _, _ = select.select(devices, [], [], timeout_left)
-        for device in r:
-            try:
-                for event in device.read():
-                    if event.type == evdev.ecodes.EV_KEY and event.value == 1:
-                        key_event = evdev.ecodes.KEY.get(event.code, event.code)
-                        print(f"Key pressed: {key_event}")
-                        return True
-            except BlockingIOError:
-                continue
-    return False
+    finally:
+        #the event loop opens its own for key presses later, don't leak these fds
+        for device in devices:
+            device.close()
     
   
+#screen layouts, compiled once: fields are only re-formatted when their value changes
+CLOCK = {
+    12: layout.Line(("{minute:%I:%M}", "{minute:%m-%d-%Y}")),
+    24: layout.Line(("{minute:%H:%M}", "{minute:%m-%d-%Y}")),
+}
+PRICE = layout.Line(("${price:.2f}{trend}", "{info}"))
+BLOCK = layout.Line(("{height}", "{min_ago} min{stale}"))
+#longest that fits wins
+FEES = layout.Line(
+    ("sat/vB", "H{fastest} M{half_hour} L{hour}"),
+    ("sat/vB", "{fastest} {half_hour} {hour}"),
+    ("s/vB", "{fastest} {half_hour} {hour}"),
+    ("H{fastest}", "M{half_hour}", "L{hour}"),
+    ("{fastest}", "{half_hour}", "{hour}"),
+)
+FEE_SPARK = layout.Line(("H{fastest}{arrow}", "{spark}"))
+CHANGE_1H = layout.Line(("${price:.0f}{trend}", "1h{change}"))
+CHANGE_LONG = layout.Line(("1d{day}", "7d{week}"))
+
 def screen_1_handler(lcd, config, price_now):
     info = "L24"
-    time_fmt = "%I:%M" if config.time_format == 12 else "%H:%M"
-    time_now = datetime.now().strftime(time_fmt)
-    date_now = datetime.now().strftime("%m-%d-%Y")
-
-    line0 = lcd.justify2(time_now, date_now)
-    line1 = lcd.justify2(f"${price_now.price:.2f}{price_now.trend}", info)
+    #whole minutes, so the line is only rebuilt when the shown time changes
+    minute = datetime.now().replace(second=0, microsecond=0)
+    line0 = CLOCK[12 if config.time_format == 12 else 24].render(minute=minute)
+    #a stale price (failed refresh or restored from cache) shows * instead of the trend
+    trend = "*" if price_now.stale else price_now.trend
+    line1 = PRICE.render(price=price_now.price, trend=trend, info=info)
     
     lcd.output(0,line0, line1)
+    #nothing on this screen changes before the next minute unless new data comes in
+    return ticks.next_boundary(60)
         
+def block_age(timestamp, now=None):
+    """
+    Whole minutes (rounded) since a block was mined, worked out when drawn so
+    it stays right between polls, and the wall time that number next changes.
+    """
+    if not timestamp:
+        return 0, None
+    now = time.time() if now is None else now
+    minutes = max(0, int((now - timestamp + 30) // 60))
+    return minutes, timestamp + minutes * 60 + 30
+
+def _block_line(block_now, fees_now):
+    #* marks block or fee data that couldn't be refreshed
+    stale = "*" if block_now.stale or fees_now.stale else ""
+    min_ago, changes_at = block_age(block_now.timestamp)
+    return BLOCK.render(height=block_now.height, min_ago=min_ago, stale=stale), changes_at
+
 def screen_2_handler(lcd, block_now, fees_now):
-    line0 = lcd.justify2(str(block_now.height), f"{str(block_now.min_ago)} min")
+    line0, changes_at = _block_line(block_now, fees_now)
+    line1 = FEES.render(fastest=fees_now.fastest, half_hour=fees_now.half_hour, hour=fees_now.hour)
+    
+    lcd.output(0,line0, line1)
+    #the block age ticks over once a minute
+    return changes_at
+
+def screen_2_spark_handler(lcd, block_now, fees_now):
+    #fastest fee, rising/falling arrow and a bar-glyph sparkline of the last fee_window
+    line0, changes_at = _block_line(block_now, fees_now)
+    arrow = lcd.glyph("up") if fees_now.slope > 0.5 else lcd.glyph("down") if fees_now.slope < -0.5 else "-"
+    line1 = FEE_SPARK.render(fastest=fees_now.fastest, arrow=arrow, spark=lcd.sparkline(fees_now.spark))
 
+    lcd.output(0,line0, line1)
+    return changes_at
 
-    line1helper = f"{fees_now.fastest} {fees_now.half_hour} {fees_now.hour}"
+def _pct(change):
+    if change is None:
+        return "--"
+    if abs(change) >= 10:
+        return f"{change:+.0f}%"
+    return f"{change:+.1f}%"
 
-    line1_0 = lcd.justify2("sat/vB", f"H{fees_now.fastest} M{fees_now.half_hour} L{fees_now.hour}")
-    line1_1 = lcd.justify2("sat/vB", f"{fees_now.fastest} {fees_now.half_hour} {fees_now.hour}")
-    line1_2 = lcd.justify2("s/vB", f"{fees_now.fastest} {fees_now.half_hour} {fees_now.hour}")
-    # line1_3 = lcd.justify2("vB", f"{fees_now.fastest} {fees_now.half_hour} {fees_now.hour}")
-    line1_3 = lcd.justify3(f"H{fees_now.fastest}", f"M{fees_now.half_hour}", f"L{fees_now.hour}")
-    line1_4 = lcd.justify3(str(fees_now.fastest), str(fees_now.half_hour), str(fees_now.hour))
+def screen_3_handler(lcd, price_now):
+    #price moves over 1 hour, 1 day and 7 days from the local price series
+    trend = "*" if price_now.stale else price_now.trend
+    line0 = CHANGE_1H.render(price=price_now.price, trend=trend, change=_pct(price_now.change_1h))
+    line1 = CHANGE_LONG.render(day=_pct(price_now.change_24h), week=_pct(price_now.change_7d))
 
-    # Get longest fit
-    options = [line1_0, line1_1, line1_2, line1_3, line1_4]
-    line1 = max((s for s in options if len(s) <= 16), key=len, default=line1_4)
-    
     lcd.output(0,line0, line1)
 
 ''' opting instead for auto restart on the system.
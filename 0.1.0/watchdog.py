@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+
+import faulthandler
+import os
+import sys
+import threading
+import time
+
+
+class Watchdog:
+    """
+    Exits the process when a part that must never block for long has been busy
+    past `timeout`: an event loop callback, an LCD write, a fetch stuck beyond
+    its http timeouts. Failing apis aren't deadlocks, the circuit breakers deal
+    with those, so this is the only way left to a restart (systemd's
+    Restart=on-failure brings the service back).
+    Every watched part reports when it got busy, None while idle, so an idle
+    part costs nothing and needs no heartbeat.
+    """
+    def __init__(self, timeout=120, interval=None, on_stall=None):
+        self.timeout = timeout
+        self.interval = interval or timeout / 4
+        self.on_stall = on_stall  # last words before exiting, e.g. saving state
+        self._watched = {}  # name -> busy_since() -> monotonic time or None
+        self._stop = threading.Event()
+
+    def watch(self, name, busy_since):
+        self._watched[name] = busy_since
+
+    def start(self):
+        threading.Thread(target=self._run, name="watchdog", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def check(self, now=None):
+        """[(name, seconds busy)] for every watched part busy longer than timeout."""
+        now = time.monotonic() if now is None else now
+        stalled = []
+        for name, busy_since in self._watched.items():
+            since = busy_since()
+            if since is not None and now - since > self.timeout:
+                stalled.append((name, now - since))
+        return stalled
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            stalled = self.check()
+            if stalled:
+                self._stall(stalled)
+
+    def _stall(self, stalled):
+        for name, seconds in stalled:
+            print(f"watchdog: {name} stuck for {seconds:.0f}s, exiting")
+        #where every thread is stuck, for journalctl
+        faulthandler.dump_traceback(file=sys.stdout, all_threads=True)
+        sys.stdout.flush()
+        if self.on_stall:
+            try:
+                self.on_stall()
+            except Exception as e:
+                print(f"watchdog: {e}")
+        #a deadlocked main thread would never see an exception, leave right here
+        os._exit(1)
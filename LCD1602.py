@@ -1,7 +1,6 @@
 # -*- coding: utf-8 -*-
 import time
-from smbus import SMBus
-b = SMBus(1)
+b = None  # shared bus, opened by the first LCD1602 that isn't handed one
 
 #Device I2C Arress
 LCD_ADDRESS   =  (0x7c>>1)
@@ -42,20 +41,52 @@ LCD_2LINE = 0x08
 LCD_1LINE = 0x00
 LCD_5x8DOTS = 0x00
 
+#SMBus block writes carry at most 32 bytes
+I2C_BLOCK_MAX = 32
+#DDRAM holds 40 characters per line, the display shows a window onto it
+DDRAM_COLS = 40
+
+
+def default_bus():
+  global b
+  if b is None:
+    # imported here so the module loads on machines without I2C (emulator, benchmarks)
+    from smbus import SMBus
+    b = SMBus(1)
+  return b
+
 
 class LCD1602:
-  def __init__(self, col, row):
+  def __init__(self, col, row, bus=None, bulk=True):
     self._row = row
     self._col = col
+    self.bus = bus or default_bus()
+    # send DDRAM runs as one block write, dropped to per byte if the bus refuses
+    self.bulk = bulk
     self._showfunction = LCD_4BITMODE | LCD_1LINE | LCD_5x8DOTS;
     self.begin(self._row,self._col)
 
         
   def command(self,cmd):
-    b.write_byte_data(LCD_ADDRESS,0x80,cmd)
+    self.bus.write_byte_data(LCD_ADDRESS,0x80,cmd)
 
   def write(self,data):
-    b.write_byte_data(LCD_ADDRESS,0x40,data)
+    self.bus.write_byte_data(LCD_ADDRESS,0x40,data)
+
+  def writeBlock(self,data):
+    # 0x40 control byte = every following byte is data, so a run goes in one transaction
+    start = 0
+    if self.bulk:
+      try:
+        while start < len(data):
+          self.bus.write_i2c_block_data(LCD_ADDRESS,0x40,list(data[start:start + I2C_BLOCK_MAX]))
+          start += I2C_BLOCK_MAX
+        return
+      except (OSError, AttributeError, NotImplementedError):
+        # controller/adapter rejected the block write, resend this chunk on per byte from here on
+        self.bulk = False
+    for x in data[start:]:
+      self.write(x)
     
   def setCursor(self,col,row):
     if(row == 0):
@@ -64,6 +95,19 @@ class LCD1602:
       col|=0xc0;
     self.command(col)
 
+  def createChar(self,location,charmap):
+    # store a 5x8 glyph (8 row bytes) in CGRAM slot 0-7, printable as chr(location)
+    location &= 0x7
+    self.command(LCD_SETCGRAMADDR | (location << 3))
+    self.writeBlock(bytearray(row & 0x1f for row in charmap[:8]))
+
+  def scrollDisplayLeft(self):
+    # shifts the window right over DDRAM on both lines, the text appears to move left
+    self.command(LCD_CURSORSHIFT | LCD_DISPLAYMOVE | LCD_MOVELEFT)
+
+  def scrollDisplayRight(self):
+    self.command(LCD_CURSORSHIFT | LCD_DISPLAYMOVE | LCD_MOVERIGHT)
+
   def clear(self):
     self.command(LCD_CLEARDISPLAY)
     time.sleep(0.002)
@@ -71,8 +115,7 @@ class LCD1602:
     if(isinstance(arg,int)):
       arg=str(arg)
 
-    for x in bytearray(arg,'utf-8'):
-      self.write(x)
+    self.writeBlock(bytearray(arg,'utf-8'))
 
 
   def display(self):
@@ -111,3 +154,49 @@ class LCD1602:
     self._showmode = LCD_ENTRYLEFT | LCD_ENTRYSHIFTDECREMENT 
     # set the entry mode
     self.command(LCD_ENTRYMODESET | self._showmode);
+
+
+class FakeSMBus:
+  # stands in for SMBus: counts transactions and adds up the time they'd take on a 100kHz bus
+  BIT_SECS = 1 / 100000
+
+  def __init__(self):
+    self.transactions = 0
+    self.bus_secs = 0.0
+
+  def _cost(self, nbytes):
+    # start + address byte + register byte + data, 9 clocks per byte + stop
+    self.transactions += 1
+    self.bus_secs += (2 + (2 + nbytes) * 9) * self.BIT_SECS
+
+  def write_byte_data(self, addr, reg, value):
+    self._cost(1)
+
+  def write_i2c_block_data(self, addr, reg, values):
+    self._cost(len(values))
+
+
+def benchmark(bus=None, frames=200):
+  # full-screen redraw, per byte vs bulk. python3 LCD1602.py [--real] (--real needs the display)
+  rows = ["12:34 10-18-2026", "$67000.00^   L24"]
+  for bulk in (False, True):
+    fake = bus or FakeSMBus()
+    lcd = LCD1602(16, 2, bus=fake, bulk=bulk)
+    if isinstance(fake, FakeSMBus):
+      fake.transactions, fake.bus_secs = 0, 0.0
+    start = time.perf_counter()
+    for _ in range(frames):
+      for row, text in enumerate(rows):
+        lcd.setCursor(0, row)
+        lcd.printout(text)
+    wall = (time.perf_counter() - start) / frames
+    label = "bulk" if lcd.bulk else "per byte"
+    if isinstance(fake, FakeSMBus):
+      print(f"{label}: {fake.transactions // frames} transactions/frame, {fake.bus_secs / frames * 1000:.2f} ms bus time/frame")
+    else:
+      print(f"{label}: {wall * 1000:.2f} ms/frame on the real bus")
+
+
+if __name__ == "__main__":
+  import sys
+  benchmark(bus=default_bus() if "--real" in sys.argv else None)